@@ -1,6 +1,23 @@
+import contextlib
+import functools
+import os
+import re
+import sqlite3
+from pathlib import Path
+from uuid import uuid4
+
+import numpy as np
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+
+from cloudmart import accounts, charts, compliance, export, loader, paging, profiling, sql, streaming
+from cloudmart.cube import COUNT_COLUMN, CostCube
+from cloudmart.dag import TableGraph
+from cloudmart.edits import EditLog, patch_delta, patch_positions, patch_values
+from cloudmart.filters import FilterView, build_indexes
+from cloudmart.policy import Policy
+from cloudmart.ranking import top_k, top_k_rows
+from cloudmart.store import RemediationStore, store_path
 
 # -------------------------------
 # PAGE CONFIG
@@ -8,200 +25,788 @@ import plotly.express as px
 st.set_page_config(page_title="CloudMart Multi-Account Dashboard", layout="wide")
 st.title("☁️ CloudMart Multi-Account Cost & Tagging Analysis")
 
+# -------------------------------
+# PERFORMANCE INSTRUMENTATION
+# -------------------------------
+# Every rerun is profiled (cloudmart.profiling): CSV read/split/clean, each derived table computed,
+# each Task Set, each figure build and each serialization is timed - with its peak memory when
+# "Trace memory" is on - and appended as one JSON line to the log below. The sidebar panel at the
+# bottom shows the last run. (The toggles are read from session state here, before they're drawn.)
+perf_log_path = r"performance_log.jsonl"
+trace_memory = st.session_state.get("perf_trace_memory", False)
+profiler = profiling.start("script", trace_memory)
+
 # -------------------------------
 # LOAD CSV FROM LOCAL PATH (CORRECTED)
 # -------------------------------
 # NOTE: Update this path if you run the app from a different location.
 csv_path = r"original - cloudmart_multi_account.csv"
+# A directory or glob of per-account exports works too: the files are parsed in parallel and
+# concatenated with an AccountID column (cloudmart.accounts). The source is chosen by whoever runs
+# the server (CLOUDMART_SOURCE=<export, directory or glob> streamlit run App.py), never by a viewer:
+# files are written next to it and loader processes started on whatever it matches.
+csv_path = os.environ.get("CLOUDMART_SOURCE", csv_path)
+# Tag policy checked in Task 3.6 (JSON, or YAML when PyYAML is installed)
+policy_path = r"tag_policy.json"
+# Exports larger than this are opened in out-of-core mode by default (see below)
+OUT_OF_CORE_BYTES = 2 * 1024 ** 3
 
-# --- FIX FOR NON-STANDARD CSV FORMAT AND DATA TYPING ---
-try:
-    df_single_col = pd.read_csv(csv_path)
 
-    # 1. Get the single column name string
-    header_string = df_single_col.columns[0]
-    
-    # 2. Split the string by comma and apply cleaning
-    cleaned_header_list = [col.strip().replace("\ufeff","") for col in header_string.split(',')]
-    
-    # 3. Split the single data column into a new DataFrame
-    df = df_single_col.iloc[:, 0].str.split(',', expand=True)
-    df.columns = cleaned_header_list
-    
-    # 4. Replace empty strings with NaN for proper missing value analysis
-    df = df.replace(r'^\s*$', float('nan'), regex=True)
+# -------------------------------
+# REMEDIATION STORE
+# -------------------------------
+# Tag fixes from Task 5 are appended to a SQLite log next to the CSV (one row per patch, keyed by
+# ResourceID) and survive reloads. The dashboard reads the inventory with every committed patch
+# overlaid; the store's version (latest patch number) is a source of the derived tables below.
+@st.cache_resource
+def open_remediation_store(path):
+    return RemediationStore(store_path(accounts.state_path(path)))
 
-    # 5. Convert 'MonthlyCostUSD' to numeric (Crucial for correct editing in Task 5)
-    df['MonthlyCostUSD'] = pd.to_numeric(df['MonthlyCostUSD'])
-    
-    st.success("✅ CSV loaded and columns successfully parsed!")
-    st.write("Columns detected:", df.columns.tolist())
 
-except Exception as e:
-    st.error(f"Error loading or parsing CSV. Check path and file format: {e}")
-    df = pd.DataFrame() # Use empty DataFrame to prevent downstream errors
+# Optional DuckDB engine (cloudmart.sql): the full-scan aggregations below run as SQL over the
+# Parquet sidecar (or over the in-memory frame while the sidecar is stale).
+QUERY_ENGINES = ["pandas", "DuckDB"] if sql.duckdb is not None else ["pandas"]
+
+# Task 4 only filters/plots by these, so its charts use the cube rolled up onto them: a few
+# hundred rows at most, however many resources the inventory holds.
+TASK4_DIMENSIONS = ["Service", "Region", "Department", "Environment", "Tagged"]
+
+TABLE_SPINNERS = {
+    "raw": "Loading inventory...",
+    "summary": "Streaming inventory in chunks...",
+    "inventory": "Applying remediation patches...",
+    "base_cube": "Aggregating costs...",
+    "base_filter_indexes": "Indexing filter columns...",
+    "base_mask": "Scoring tag completeness...",
+    "base_policy_report": "Checking tag policy...",
+}
 
-# ----------------------------------------------------------------------------------
+
+@contextlib.contextmanager
+def computing(name):
+    with st.spinner(TABLE_SPINNERS.get(name, f"Computing {name}...")), profiling.stage(f"Table {name}"):
+        yield
 
 
 # -------------------------------
-# TASK 1 — DATA EXPLORATION
+# DERIVED TABLES
+# -------------------------------
+# Every derived dataset is a named node declaring its inputs (cloudmart.dag):
+#
+#   files ── raw ──┬── base_cube, base_mask, base_filter_indexes, base_policy_report, ...
+#   patches ── patch_log ──┴── edits ──┬── inventory, preview
+#                                      ├── cost_cube ── task4_cube   (base_cube: raw, sql, engine)
+#                                      ├── missing_counts, missing_histogram
+#                                      ├── missing_mask, completeness, incomplete_rows
+#                                      ├── filter_indexes
+#                                      └── policy_report (+ policy, policy_file)
+#   files ── summary (out-of-core mode)
+#
+# Each table a commit changes is a base_* table, built once over the export as loaded, brought up
+# to date with just the edited rows (edits, see below).
+#
+# The sources are versions supplied per rerun: the export's identity (files), the store's patch
+# number (patches), the aggregation engine and the policy file's identity. A table is recomputed
+# only when something upstream changed version - a file refresh, a committed Task 5 edit -
+# and otherwise every rerun and session pulls the cached result. One graph per inventory source.
+@st.cache_resource(max_entries=2, show_spinner=False)
+def derived_tables(path):
+    tables = TableGraph(observer=computing)
+
+    # --- FIX FOR NON-STANDARD CSV FORMAT AND DATA TYPING ---
+    # The full-size frames keep two versions (the current one and the one before a refresh or a
+    # commit, for fragments still showing it); every other table keeps dag.KEEP_VERSIONS.
+    @tables.table("raw", ["files"], keep=2)
+    def raw(files):
+        # The export quotes each whole row as a single field; the loader strips the outer quotes
+        # while streaming the file through pandas' C parser, so rows are decoded in one pass
+        # straight into typed columns (header BOM removed, blank fields -> NaN). Tag columns load as
+        # categoricals, Tagged as a nullable boolean and the cost as float64 (loader.INVENTORY_SCHEMA).
+        # After the first parse a Parquet sidecar is written next to the CSV; later cold starts
+        # memory-map that instead. A directory or glob of account exports is parsed in parallel
+        # and concatenated (cloudmart.accounts).
+        return accounts.load_source(path)
+
+    @tables.table("patch_log", ["patches"])
+    def patch_log(patch_version):
+        # Version 0: nothing committed yet (or no store available), no need to touch the database
+        # Exactly the patches up to this version: a snapshot at an older version never sees newer ones
+        return open_remediation_store(path).load(patch_version) if patch_version else EditLog()
+
+    @tables.table("sql", ["raw", "engine"])
+    def sql_inventory(raw, engine):
+        # Several exports are aggregated per account file instead (accounts.refresh_source)
+        if engine != "DuckDB" or accounts.is_multi_file(path):
+            return None
+        if loader.sidecar_is_fresh(path):
+            return sql.SqlInventory(loader.sidecar_path(path))
+        return sql.SqlInventory(raw)
+
+    # The aggregates are kept up to date with the remediation patches by deltas: they are built
+    # once over the export as loaded, then the rows the patches touch are taken out as they were
+    # and put back in as edited (EditLog.changes). A committed Task 5 edit costs work in the number
+    # of edited rows, not a new scan of the inventory.
+    @tables.table("key_index", ["raw"])
+    def key_index(raw):
+        return pd.Index(raw["ResourceID"])
+
+    @tables.table("edits", ["raw", "patch_log", "key_index"])
+    def edits(raw, log, index):
+        # (before, after, added), or None while nothing is committed
+        return log.changes(raw, index) if len(log) else None
+
+    # The edited columns are copied and only the edited rows written (deleted rows dropped, added
+    # rows appended): no scan of every ResourceID per commit
+    @tables.table("inventory", ["raw", "patch_log", "edits"], keep=2)
+    def inventory(raw, log, edits):
+        return log.apply_changes(raw, edits) if edits is not None else raw
+
+    # First rows of the inventory (1.1): only the head of the export is patched
+    @tables.table("preview", ["raw", "patch_log", "key_index"])
+    def preview(raw, log, index):
+        if not len(log):
+            return raw.head()
+        # Enough rows that the first five survive the deletions (a ResourceID may be on several rows)
+        n_deleted = len(index.get_indexer_for(list(log.deleted)))
+        return log.apply(raw.head(5 + n_deleted)).head()
+
+    # One group-by pass over the inventory (Department × Project × Environment × Service × Region ×
+    # Tagged -> cost sum and resource count). Task Sets 1, 2 and 4 answer from this cube instead of
+    # scanning the full frame per section.
+    @tables.table("base_cube", ["raw", "sql"])
+    def base_cube(raw, sql_inventory):
+        if accounts.is_multi_file(path):
+            # Merged from the per-account partial cubes; only changed exports were re-aggregated
+            return accounts.refresh_source(path).cube()
+        if sql_inventory is not None:
+            return sql_inventory.cost_cube()
+        return CostCube.from_inventory(raw)
+
+    @tables.table("cost_cube", ["base_cube", "edits"])
+    def cost_cube(cube, edits):
+        if edits is None:
+            return cube
+        before, after, added = edits
+        return cube.apply_delta(removed=[before], added=[after, added])
+
+    @tables.table("base_missing_counts", ["raw", "sql"])
+    def base_missing_counts(raw, sql_inventory):
+        if accounts.is_multi_file(path):
+            return accounts.refresh_source(path).missing_counts()
+        if sql_inventory is not None:
+            return sql_inventory.missing_counts()
+        return raw.isnull().sum()
+
+    @tables.table("missing_counts", ["base_missing_counts", "edits"])
+    def missing_counts(counts, edits):
+        if edits is None:
+            return counts
+        before, after, added = edits
+        return counts - before.isnull().sum() + after.isnull().sum() + added.isnull().sum()
+
+    @tables.table("task4_cube", ["cost_cube"])
+    def task4_cube(cube):
+        return cube.project(TASK4_DIMENSIONS)
+
+    # Inverted index (value -> row positions + row bitmap) for the Task 4 filter columns.
+    # Stacked multiselects intersect bitmaps instead of running isin scans.
+    @tables.table("base_filter_indexes", ["raw"])
+    def base_filter_indexes(raw):
+        return build_indexes(raw)
+
+    @tables.table("filter_indexes", ["base_filter_indexes", "inventory", "edits"])
+    def filter_indexes(indexes, inventory, edits):
+        if edits is None:
+            return indexes
+        before, after, added = edits
+        if len(before) > len(after):
+            # Deleted rows shift every later row position: index the inventory again
+            return build_indexes(inventory)
+        # Edited rows keep their positions, added rows are appended: only their bits move
+        positions = np.concatenate([after.index.to_numpy(), len(inventory) - len(added) + np.arange(len(added))])
+        return {col: index.updated(positions, [*after[col], *added[col]], len(inventory))
+                for col, index in indexes.items()}
+
+    # One uint8 per resource, one bit per missing required tag (compliance.missing_bitmask): the
+    # Task 3 score, missing-field histogram and incomplete filter are all derived from it.
+    @tables.table("base_mask", ["raw"])
+    def base_mask(raw):
+        fields = [col for col in compliance.TAG_FIELDS if col in raw.columns]
+        mask = compliance.missing_bitmask(raw, fields)
+        mask.flags.writeable = False
+        return mask
+
+    @tables.table("missing_mask", ["base_mask", "raw", "edits"])
+    def missing_mask(mask, raw, edits):
+        if edits is None:
+            return mask
+        # Only the edited rows are re-scored; rows are laid out as in the inventory (deleted rows
+        # dropped, added rows appended - see EditLog.apply)
+        fields = [col for col in compliance.TAG_FIELDS if col in raw.columns]
+        mask = patch_values(mask, edits, lambda rows: compliance.missing_bitmask(rows, fields))
+        mask.flags.writeable = False
+        return mask
+
+    @tables.table("base_histogram", ["base_mask"])
+    def base_histogram(mask):
+        return compliance.mask_histogram(mask)
+
+    @tables.table("missing_histogram", ["base_histogram", "raw", "edits"])
+    def missing_histogram(histogram, raw, edits):
+        # Missing-field counts of 3.3, from the edited rows' masks rather than a new bincount
+        if edits is None:
+            return histogram
+        fields = [col for col in compliance.TAG_FIELDS if col in raw.columns]
+        before, after, added = edits
+        return (histogram - compliance.mask_histogram(compliance.missing_bitmask(before, fields))
+                + compliance.mask_histogram(compliance.missing_bitmask(after, fields))
+                + compliance.mask_histogram(compliance.missing_bitmask(added, fields)))
+
+    # The score and the incomplete rows are likewise patched at the edited rows only
+    @tables.table("base_completeness", ["base_mask", "raw"])
+    def base_completeness(mask, raw):
+        fields = [col for col in compliance.TAG_FIELDS if col in raw.columns]
+        score = compliance.completeness_score(mask, len(fields))
+        score.flags.writeable = False
+        return score
+
+    @tables.table("completeness", ["base_completeness", "raw", "edits"])
+    def completeness(score, raw, edits):
+        if edits is None:
+            return score
+        fields = [col for col in compliance.TAG_FIELDS if col in raw.columns]
+        score = patch_values(score, edits, lambda rows: compliance.completeness_score(
+            compliance.missing_bitmask(rows, fields), len(fields)))
+        score.flags.writeable = False
+        return score
+
+    @tables.table("base_incomplete", ["base_mask"])
+    def base_incomplete(mask):
+        return np.flatnonzero(compliance.rows_missing(mask))
+
+    @tables.table("incomplete_rows", ["base_incomplete", "raw", "edits"])
+    def incomplete_rows(rows, raw, edits):
+        # Positions of the resources missing at least one tag (the unfiltered 3.4 table)
+        if edits is None:
+            return rows
+        fields = [col for col in compliance.TAG_FIELDS if col in raw.columns]
+        return patch_positions(rows, len(raw), edits,
+                               lambda rows: compliance.rows_missing(compliance.missing_bitmask(rows, fields)))
+
+    # The policy file is compiled once per version of the file; its rules are then evaluated as
+    # whole-column predicates over the inventory (cloudmart.policy).
+    @tables.table("policy", ["policy_file"])
+    def policy(policy_file):
+        return Policy.from_file(policy_file[0])
+
+    # Evaluated once over the export as loaded; a commit re-evaluates the edited rows only, and the
+    # per-rule counts and costs are updated by taking them out as they were and back in as edited.
+    @tables.table("base_policy_report", ["policy", "raw"])
+    def base_policy_report(policy, raw):
+        return policy.evaluate(raw)
+
+    @tables.table("policy_report", ["policy", "base_policy_report", "edits"])
+    def policy_report(policy, base_report, edits):
+        report, violations = base_report
+        if edits is not None:
+            before, after, added = edits
+            for rows, sign in ((before, -1), (after, 1), (added, 1)):
+                if len(rows):
+                    delta = policy.evaluate(rows)[0]
+                    report = report.assign(Violations=report["Violations"] + sign * delta["Violations"],
+                                           CostImpactUSD=report["CostImpactUSD"] + sign * delta["CostImpactUSD"])
+            violations = patch_values(violations, edits, lambda rows: policy.evaluate(rows)[1])
+        violations.flags.writeable = False
+        return report, violations
+
+    # -------------------------------
+    # OUT-OF-CORE MODE
+    # -------------------------------
+    # For exports that don't fit in memory the CSV is streamed in chunks and folded into the cube,
+    # the missing counts/histogram and the lowest-scoring rows (cloudmart.streaming); the incomplete
+    # resources are paged from an on-disk Parquet index. No resource frame is held in memory, so the
+    # sections that need one (4.5, 3.6 and the Task 5 editor) are unavailable in this mode, and the
+    # export is summarized as is, without the remediation patches overlaid.
+    @tables.table("summary", ["files"])
+    def summary(files):
+        return streaming.summarize(path)
+
+    return tables
+
+
+# -------------------------------
+# PAGED TABLES
 # -------------------------------
-st.header("📊 Task Set 1 — Data Exploration")
-if not df.empty:
-    st.subheader("1.1 First 5 Rows")
-    st.dataframe(df.head())
+# Large tables are windowed on the server: search and sort are resolved to row positions here
+# and only the selected page of rows is sent to the browser.
+PAGE_SIZES = [25, 50, 100, 500]
 
-    st.subheader("1.2 Missing Values per Column")
-    st.write(df.isnull().sum())
 
-    st.subheader("1.3 Columns With Most Missing Values")
-    st.write(df.isnull().sum().sort_values(ascending=False).head(5))
+def window_controls(key, columns):
+    search_col, sort_col, order_col, size_col, page_col = st.columns([3, 2, 1, 1, 1])
+    search = search_col.text_input("Search", key=f"{key}_search")
+    sort_by = sort_col.selectbox("Sort by", [None, *columns], key=f"{key}_sort",
+                                 format_func=lambda col: "(file order)" if col is None else col)
+    ascending = order_col.toggle("Ascending", value=True, key=f"{key}_ascending")
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    page_number = page_col.number_input("Page", min_value=1, step=1, key=f"{key}_page")
+    return search, sort_by, ascending, page_size, page_number
 
-    st.subheader("1.4 Count of Tagged vs Untagged Resources")
-    if "Tagged" in df.columns:
-        st.write(df["Tagged"].value_counts(dropna=False))
-    else:
-        st.warning("Column 'Tagged' not found")
 
-    st.subheader("1.5 Percentage of Untagged Resources")
-    if "Tagged" in df.columns and "No" in df["Tagged"].values:
-        pct_untagged = (df[df["Tagged"] == "No"].shape[0] / df.shape[0]) * 100
-        st.write(f"🔸 {pct_untagged:.2f}% of resources are untagged")
+def paged_rows(frame, window, rows=None):
+    # rows: positions of the rows of frame to page (all of them by default)
+    search, sort_by, ascending, page_size, page_number = window
+    positions = paging.sort_positions(frame, paging.search_positions(frame, search, rows=rows), sort_by, ascending)
+    n_pages = paging.page_count(len(positions), page_size)
+    page_number = min(page_number, n_pages)
+    caption = f"Page {page_number} of {n_pages} · {len(positions)} matching rows"
+    return paging.page(frame, positions, page_number, page_size), caption
 
 
 # -------------------------------
-# TASK 2 — COST VISIBILITY
+# DOWNLOADS
 # -------------------------------
-st.header("💰 Task Set 2 — Cost Visibility")
-if not df.empty and all(col in df.columns for col in ["Tagged", "MonthlyCostUSD"]):
-    st.subheader("2.1 Total Cost: Tagged vs Untagged")
-    st.write(df.groupby("Tagged")["MonthlyCostUSD"].sum())
+# Exports are produced only when a button is clicked (st.download_button takes a callable), written
+# in row chunks and optionally compressed, instead of serializing every table on every rerun.
+def download_button(label, make_frame, stem, key):
+    format_col, button_col = st.columns([1, 3])
+    fmt = format_col.selectbox("Format", list(export.EXPORT_FORMATS), key=f"{key}_format",
+                               label_visibility="collapsed")
+    def serialize():
+        # Runs when the button is clicked, outside the script run: profiled as a run of its own
+        with profiling.section(f"Export {export.file_name(stem, fmt)}", perf_log_path, trace_memory):
+            return export.export(make_frame(), fmt)
+
+    button_col.download_button(label, serialize, export.file_name(stem, fmt),
+                               mime=export.mime_type(fmt), key=f"{key}_download")
+
+
+# Out-of-core mode pages its on-disk index of incomplete resources instead
+def paged_store(store, key):
+    size_col, page_col = st.columns([1, 1])
+    page_size = size_col.selectbox("Rows per page", PAGE_SIZES, key=f"{key}_page_size")
+    n_pages = paging.page_count(len(store), page_size)
+    page_number = min(page_col.number_input("Page", min_value=1, step=1, key=f"{key}_page"), n_pages)
+    start = (page_number - 1) * page_size
+    return store.rows(start, start + page_size), f"Page {page_number} of {n_pages} · {len(store)} rows"
+
+
+def timed(name):
+    # A Task Set is a stage of the script run - or, when its fragment reruns alone, a run of its own
+    def decorate(task_set):
+        @functools.wraps(task_set)
+        def run(*args, **kwargs):
+            with profiling.section(name, perf_log_path, trace_memory):
+                return task_set(*args, **kwargs)
+        return run
+    return decorate
+
+
+def show_chart(section, build, data):
+    # Figure build and its serialization (st.plotly_chart encodes the figure as JSON) are timed apart
+    with profiling.stage(f"{section} figure"):
+        fig = build(data)
+    with profiling.stage(f"{section} serialize"):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+TASK4_TABLE_COLUMNS = ["ResourceID", "Service", "Region", "Department", "Environment", "MonthlyCostUSD", "Tagged"]
+
+
+multi_file = accounts.is_multi_file(csv_path)
+out_of_core = st.sidebar.toggle(
+    "Out-of-core mode", value=os.path.isfile(csv_path) and os.path.getsize(csv_path) > OUT_OF_CORE_BYTES,
+    disabled=multi_file, help="Stream the export in chunks instead of loading it into memory "
+                              "(for very large single-file inventories).") and not multi_file
+query_engine = st.sidebar.selectbox("Aggregation engine", QUERY_ENGINES, disabled=out_of_core,
+                                    help="Engine computing the cost cube and missing-value counts.")
 
-    st.subheader("2.2 Percentage of Total Cost That is Untagged")
-    total_cost = df["MonthlyCostUSD"].sum()
-    untagged_cost = df[df["Tagged"] == "No"]["MonthlyCostUSD"].sum()
+try:
+    inventory_key = accounts.source_identity(csv_path)
+    try:
+        remediation_store = open_remediation_store(csv_path)
+        patch_version = remediation_store.version()
+    except (OSError, sqlite3.Error) as e:
+        st.warning(f"Remediation store unavailable, Task 5 edits can't be saved: {e}")
+        remediation_store, patch_version = None, 0
+    tables = derived_tables(csv_path).at(files=inventory_key, patches=patch_version, engine=query_engine)
+    remediation_log = tables["patch_log"]
+    if out_of_core:
+        summary = tables["summary"]
+        columns, n_rows, preview, missing_by_column = summary.columns, summary.n_rows, summary.preview, summary.missing
+        cube = summary.cube
+        task4_cube = cube.project(TASK4_DIMENSIONS)
+    else:
+        # Only aggregates here: the row-level tables are pulled by the Task Sets that list resources
+        cube = tables["cost_cube"]
+        columns, n_rows, preview = tables["raw"].columns.tolist(), int(cube.total(COUNT_COLUMN)), tables["preview"]
+        missing_by_column = tables["missing_counts"]
+        task4_cube = tables["task4_cube"]
+        summary = None
     
-    if total_cost > 0:
-        st.write(f"🔸 {untagged_cost / total_cost * 100:.2f}% of monthly cost is untagged")
+    st.success("✅ CSV loaded and columns successfully parsed!")
+    st.write("Columns detected:", columns)
 
-if not df.empty and all(col in df.columns for col in ["Department", "MonthlyCostUSD", "Tagged"]):
-    st.subheader("2.3 Department With Most Untagged Cost")
-    dept_untagged = df[df["Tagged"] == "No"].groupby("Department")["MonthlyCostUSD"].sum()
-    st.write(dept_untagged.sort_values(ascending=False))
+except Exception as e:
+    st.error(f"Error loading or parsing CSV. Check path and file format: {e}")
+    columns, n_rows, preview, missing_by_column = [], 0, pd.DataFrame(), pd.Series(dtype="int64")
+    cube = task4_cube = summary = None
+    inventory_key = tables = remediation_store = None
+    remediation_log = EditLog()
 
-if not df.empty and all(col in df.columns for col in ["Project", "MonthlyCostUSD"]):
-    st.subheader("2.4 Project With Highest Total Cost")
-    st.write(df.groupby("Project")["MonthlyCostUSD"].sum().sort_values(ascending=False).head(5))
+# ----------------------------------------------------------------------------------
 
-if not df.empty and all(col in df.columns for col in ["Environment", "MonthlyCostUSD", "Tagged"]):
-    st.subheader("2.5 Prod vs Dev Cost Comparison")
-    st.write(df.groupby(["Environment", "Tagged"])["MonthlyCostUSD"].sum())
 
+# Ranking sections (1.3, 2.3, 2.4, 3.2) show the top N entries, found by partial selection
+# (cloudmart.ranking) rather than a full sort; ties are ordered by ResourceID / label.
+top_n = st.sidebar.number_input("Top N in ranking sections", min_value=1, max_value=100, value=5, step=1)
+
+# Navigation: one page with every Task Set, or tabs where only the opened Task Set is computed
+# (and the Task 5 editor / 3.4 table are never built unless their tab is opened). Everything a
+# Task Set computes is cached, so switching back to a tab is cheap.
+layout = st.sidebar.radio("Layout", ["Single page", "Tabs"], horizontal=True)
+
+tag_fields = [col for col in compliance.TAG_FIELDS if col in columns]
 
-# -------------------------------
-# TASK 3 — TAGGING COMPLIANCE
-# -------------------------------
-st.header("🏷️ Task Set 3 — Tagging Compliance")
-tag_fields = [col for col in ["Department","Project","Environment","Owner","CostCenter","CreatedBy"] if col in df.columns]
 
-if not df.empty and tag_fields:
+def score_completeness(df, tables, tag_fields):
+    # Per-resource tag completeness, shared by Task 3 (scores, filters) and the Task 5 editor
+    if df.empty or not tag_fields:
+        return None
     # Calculate completeness score based on the number of non-null tag fields
-    df["CompletenessScore"] = df[tag_fields].notnull().sum(axis=1)
+    df["CompletenessScore"] = tables["completeness"]
+    return tables["missing_mask"]
+
+
+# Defined anew every run, so it's cached for this run only
+@functools.cache
+def inventory_frame():
+    # The patched inventory, for the Task Sets listing resources (3, 4 and 5)
+    if out_of_core or tables is None:
+        return pd.DataFrame()  # nothing row-level in memory (or nothing loaded): use an empty frame
+    # Shallow copy: adding derived columns (e.g. CompletenessScore) never touches the cached frame,
+    # and copy-on-write keeps any other write from reaching the arrays shared with other sessions
+    return tables["inventory"].copy(deep=False)
 
-    st.subheader("3.1 Tag Completeness Score Per Resource")
-    st.write(df[["ResourceID","CompletenessScore"]].head())
+# Each Task Set below is a fragment with explicit inputs: interacting with a widget inside one
+# (a Task 4 filter, a 3.4 page, ...) reruns only that Task Set against the data loaded by the last
+# full run. Changing the data itself (a committed Task 5 edit, the sidebar settings) reruns the app.
+
+# -------------------------------
+# TASK 1 — DATA EXPLORATION
+# -------------------------------
+@st.fragment
+@timed("Task Set 1")
+def task_set_1(preview, missing_by_column, cube, columns, n_rows, top_n):
+    st.header("📊 Task Set 1 — Data Exploration")
+    if n_rows:
+        st.subheader("1.1 First 5 Rows")
+        st.dataframe(loader.with_tag_labels(preview))
+
+        st.subheader("1.2 Missing Values per Column")
+        st.write(missing_by_column)
+
+        st.subheader("1.3 Columns With Most Missing Values")
+        st.write(top_k(missing_by_column, top_n))
+
+        st.subheader("1.4 Count of Tagged vs Untagged Resources")
+        if "Tagged" in columns:
+            tagged_counts = cube.rollup("Tagged", dropna=False)[COUNT_COLUMN].sort_values(ascending=False).rename("count")
+            st.write(tagged_counts.rename(index=loader.TAGGED_LABELS))
+        else:
+            st.warning("Column 'Tagged' not found")
+
+        st.subheader("1.5 Percentage of Untagged Resources")
+        untagged_resources = cube.total(COUNT_COLUMN, where={"Tagged": [False]}) if "Tagged" in columns else 0
+        if untagged_resources:
+            pct_untagged = (untagged_resources / n_rows) * 100
+            st.write(f"🔸 {pct_untagged:.2f}% of resources are untagged")
 
-    st.subheader("3.2 Top 5 Resources With Lowest Completeness Score")
-    st.write(df.sort_values("CompletenessScore").head(5))
 
-    st.subheader("3.3 Most Frequently Missing Tag Fields")
-    st.write(df[tag_fields].isnull().sum().sort_values(ascending=False))
+# -------------------------------
+# TASK 2 — COST VISIBILITY
+# -------------------------------
+@st.fragment
+@timed("Task Set 2")
+def task_set_2(cube, columns, n_rows, top_n):
+    st.header("💰 Task Set 2 — Cost Visibility")
+    if n_rows and all(col in columns for col in ["Tagged", "MonthlyCostUSD"]):
+        st.subheader("2.1 Total Cost: Tagged vs Untagged")
+        st.write(cube.rollup("Tagged")["MonthlyCostUSD"].rename(index=loader.TAGGED_LABELS))
+
+        st.subheader("2.2 Percentage of Total Cost That is Untagged")
+        total_cost = cube.total()
+        untagged_cost = cube.total(where={"Tagged": [False]})
     
-    # --- TASK 3.4/3.5: Filter for ALL incomplete resources ---
-    st.subheader("3.4 Incomplete Resources")
+        if total_cost > 0:
+            st.write(f"🔸 {untagged_cost / total_cost * 100:.2f}% of monthly cost is untagged")
+
+    if n_rows and all(col in columns for col in ["Department", "MonthlyCostUSD", "Tagged"]):
+        st.subheader("2.3 Department With Most Untagged Cost")
+        dept_untagged = cube.rollup("Department", where={"Tagged": [False]})["MonthlyCostUSD"]
+        st.write(top_k(dept_untagged, top_n))
+
+    if n_rows and all(col in columns for col in ["Project", "MonthlyCostUSD"]):
+        st.subheader("2.4 Project With Highest Total Cost")
+        st.write(top_k(cube.rollup("Project")["MonthlyCostUSD"], top_n))
+
+    if n_rows and all(col in columns for col in ["Environment", "MonthlyCostUSD", "Tagged"]):
+        st.subheader("2.5 Prod vs Dev Cost Comparison")
+        env_tagged_cost = cube.rollup(["Environment", "Tagged"])["MonthlyCostUSD"]
+        st.write(env_tagged_cost.rename(index=loader.TAGGED_LABELS, level="Tagged"))
+
+
+# -------------------------------
+# TASK 3 — TAGGING COMPLIANCE
+# -------------------------------
+@st.fragment
+@timed("Task Set 3")
+def task_set_3(df, preview, summary, tag_fields, missing_mask, tables, top_n):
+    st.header("🏷️ Task Set 3 — Tagging Compliance")
+    if summary is not None and tag_fields:
+        # Scores, histogram and lowest rows were folded chunk by chunk; 3.4 pages the on-disk index
+        st.subheader("3.1 Tag Completeness Score Per Resource")
+        preview_scores = compliance.completeness_score(compliance.missing_bitmask(preview, tag_fields), len(tag_fields))
+        st.write(preview[["ResourceID"]].assign(CompletenessScore=preview_scores))
+
+        st.subheader(f"3.2 Top {top_n} Resources With Lowest Completeness Score")
+        st.write(loader.with_tag_labels(summary.lowest.head(top_n)))
+
+        st.subheader("3.3 Most Frequently Missing Tag Fields")
+        st.write(summary.missing_counts().sort_values(ascending=False))
+
+        st.subheader("3.4 Incomplete Resources")
+        incomplete_rows = summary.incomplete_rows()
+        incomplete_page, caption = paged_store(incomplete_rows, "incomplete_ooc")
+        st.caption(caption)
+        st.dataframe(loader.with_tag_labels(incomplete_page).astype(object).fillna(''))
+
+        st.subheader("3.5 Download Incomplete Resources CSV")
+        if len(incomplete_rows):
+            st.download_button("⬇️ Download Incomplete Resources (Parquet)", lambda: Path(incomplete_rows.path).read_bytes(),
+                               "incomplete_resources.parquet", mime=export.mime_type("Parquet"))
+    elif missing_mask is not None:
+        st.subheader("3.1 Tag Completeness Score Per Resource")
+        st.write(df[["ResourceID","CompletenessScore"]].head())
+
+        st.subheader(f"3.2 Top {top_n} Resources With Lowest Completeness Score")
+        st.write(loader.with_tag_labels(top_k_rows(df, "CompletenessScore", top_n)))
+
+        st.subheader("3.3 Most Frequently Missing Tag Fields")
+        st.write(compliance.histogram_counts(tables["missing_histogram"], tag_fields).sort_values(ascending=False))
     
-    # Create a mask: True if ANY of the required tag columns is NaN/missing.
-    incomplete_mask = df[tag_fields].isnull().any(axis=1)
+        # --- TASK 3.4/3.5: Filter for ALL incomplete resources ---
+        st.subheader("3.4 Incomplete Resources")
     
-    # Filter the DataFrame for incomplete rows and fill NaN for clean display in this section
-    incomplete_df = df[incomplete_mask].fillna('') 
+        # Create a mask: True if ANY of the required tag columns is NaN/missing, or, when tags are
+        # picked below, if (exactly) those tags are missing.
+        missing_col, exact_col = st.columns([3, 1])
+        missing_filter = missing_col.multiselect("Filter by missing tags", tag_fields)
+        exact_missing = exact_col.toggle("Exactly these tags missing", disabled=not missing_filter)
     
-    # Define 'untagged_df' to be used in the Download button
-    untagged_df = incomplete_df
+        # Positions of the incomplete rows (unfiltered: the cached 'incomplete_rows'); only the page
+        # shown is taken out of the DataFrame
+        if missing_filter:
+            incomplete_mask = compliance.rows_missing(missing_mask, compliance.bits_for(tag_fields, missing_filter), exact_missing)
+            incomplete_rows = np.flatnonzero(incomplete_mask)
+        else:
+            incomplete_rows = tables["incomplete_rows"]
     
-    st.dataframe(untagged_df)
+        # Only the visible page is filled for clean display (object dtype first: categorical/boolean
+        # columns can't hold '')
+        incomplete_page, caption = paged_rows(df, window_controls("incomplete", df.columns), incomplete_rows)
+        st.caption(caption)
+        with profiling.stage("3.4 serialize"):
+            st.dataframe(loader.with_tag_labels(incomplete_page).astype(object).fillna(''))
     
-    st.subheader("3.5 Download Incomplete Resources CSV")
-    if not untagged_df.empty:
-        st.download_button("⬇️ Download Incomplete Resources", untagged_df.to_csv(index=False), "incomplete_resources.csv")
-else:
-    untagged_df = pd.DataFrame()
-    st.warning("No tag columns found to calculate CompletenessScore.")
+        st.subheader("3.5 Download Incomplete Resources CSV")
+        if len(incomplete_rows):
+            download_button("⬇️ Download Incomplete Resources", lambda: loader.with_tag_labels(df.iloc[incomplete_rows]),
+                            "incomplete_resources", "incomplete")
+    else:
+        st.warning("No tag columns found to calculate CompletenessScore.")
+
+    if not df.empty:
+        st.subheader("3.6 Tag Policy Compliance")
+        try:
+            policy_report, policy_violations = tables.at(policy_file=loader.file_identity(policy_path))["policy_report"]
+        except (OSError, ImportError, ValueError, re.error) as e:
+            st.warning(f"Tag policy '{policy_path}' couldn't be loaded: {e}")
+        else:
+            violating_cost = df.loc[policy_violations, "MonthlyCostUSD"].sum()
+            st.write(f"{int(policy_violations.sum())} of {len(df)} resources violate at least one of "
+                     f"{len(policy_report)} rules (${violating_cost:,.2f} monthly cost).")
+            st.dataframe(policy_report.sort_values(["Violations", "CostImpactUSD"], ascending=False),
+                         hide_index=True)
 
 
 # -------------------------------
 # TASK 4 — VISUALIZATION DASHBOARD
 # -------------------------------
-st.header("📈 Task Set 4 — Visualization Dashboard")
-
-filtered = df.copy()
-
-# Add filters only if columns exist
-if "Service" in df.columns:
-    service_filter = st.multiselect("Filter by Service", df["Service"].dropna().unique())
-    if service_filter: filtered = filtered[filtered["Service"].isin(service_filter)]
-
-if "Region" in df.columns:
-    region_filter = st.multiselect("Filter by Region", df["Region"].dropna().unique())
-    if region_filter: filtered = filtered[filtered["Region"].isin(region_filter)]
-
-if "Department" in df.columns:
-    dept_filter = st.multiselect("Filter by Department", df["Department"].dropna().unique())
-    if dept_filter: filtered = filtered[filtered["Department"].isin(dept_filter)]
-
-if not filtered.empty:
-    # 4.1 Pie chart: Tagged vs Untagged
-    st.subheader("4.1 Tagged vs Untagged Resources")
-    if "Tagged" in df.columns:
-        # Drop rows where 'Tagged' status itself is missing for plotting clarity
-        fig1 = px.pie(filtered.dropna(subset=['Tagged']), names="Tagged", title="Tag Compliance")
-        st.plotly_chart(fig1, use_container_width=True)
-
-    # 4.2 Bar chart: Cost per Department by Tag
-    st.subheader("4.2 Cost per Department (Tagged vs Untagged)")
-    if all(col in df.columns for col in ["Department", "MonthlyCostUSD", "Tagged"]):
-        dept_cost = filtered.groupby(["Department","Tagged"])["MonthlyCostUSD"].sum().reset_index()
-        fig2 = px.bar(dept_cost, x="Department", y="MonthlyCostUSD", color="Tagged", barmode="group",
-                      title="Total Monthly Cost by Department and Tag Status")
-        st.plotly_chart(fig2, use_container_width=True)
-
-    # 4.3 Horizontal bar: Total cost per Service
-    st.subheader("4.3 Total Cost per Service")
-    if all(col in df.columns for col in ["Service", "MonthlyCostUSD"]):
-        service_cost = filtered.groupby("Service")["MonthlyCostUSD"].sum().sort_values().reset_index()
-        fig3 = px.bar(service_cost, x="MonthlyCostUSD", y="Service", orientation="h",
-                      title="Total Monthly Cost by Service")
-        st.plotly_chart(fig3, use_container_width=True)
-
-    # 4.4 Cost by Environment
-    st.subheader("4.4 Cost by Environment")
-    if all(col in df.columns for col in ["Environment", "MonthlyCostUSD"]):
-        env_cost = filtered.groupby("Environment")["MonthlyCostUSD"].sum().reset_index()
-        fig4 = px.bar(env_cost, x="Environment", y="MonthlyCostUSD", color="Environment",
-                      title="Total Monthly Cost by Environment")
-        st.plotly_chart(fig4, use_container_width=True)
+@st.fragment
+@timed("Task Set 4")
+def task_set_4(df, columns, task4_cube, tables):
+    st.header("📈 Task Set 4 — Visualization Dashboard")
+
+    # Selections are applied to the Task 4 cube rather than to a filtered copy of the inventory
+    task4_where = {}
+
+    # Add filters only if columns exist
+    if "Service" in columns:
+        task4_where["Service"] = st.multiselect("Filter by Service", task4_cube.values("Service"))
+
+    if "Region" in columns:
+        task4_where["Region"] = st.multiselect("Filter by Region", task4_cube.values("Region"))
+
+    if "Department" in columns:
+        task4_where["Department"] = st.multiselect("Filter by Department", task4_cube.values("Department"))
+
+    if task4_cube is not None and task4_cube.total(COUNT_COLUMN, where=task4_where) > 0:
+        # 4.1 Pie chart: Tagged vs Untagged
+        st.subheader("4.1 Tagged vs Untagged Resources")
+        if "Tagged" in columns:
+            # Resource counts per status; rollup drops a missing 'Tagged' status for plotting clarity.
+            # The charts module only takes pre-aggregated frames, so figure size never grows with rows.
+            tagged_counts = task4_cube.rollup("Tagged", where=task4_where)[COUNT_COLUMN].reset_index()
+            show_chart("4.1", charts.tag_compliance_pie, tagged_counts)
+
+        # 4.2 Bar chart: Cost per Department by Tag
+        st.subheader("4.2 Cost per Department (Tagged vs Untagged)")
+        if all(col in columns for col in ["Department", "MonthlyCostUSD", "Tagged"]):
+            dept_cost = task4_cube.rollup(["Department","Tagged"], where=task4_where)["MonthlyCostUSD"].reset_index()
+            show_chart("4.2", charts.department_cost_bar, dept_cost)
+
+        # 4.3 Horizontal bar: Total cost per Service
+        st.subheader("4.3 Total Cost per Service")
+        if all(col in columns for col in ["Service", "MonthlyCostUSD"]):
+            service_cost = task4_cube.rollup("Service", where=task4_where)["MonthlyCostUSD"].sort_values().reset_index()
+            show_chart("4.3", charts.service_cost_bar, service_cost)
+
+        # 4.4 Cost by Environment
+        st.subheader("4.4 Cost by Environment")
+        if all(col in columns for col in ["Environment", "MonthlyCostUSD"]):
+            env_cost = task4_cube.rollup("Environment", where=task4_where)["MonthlyCostUSD"].reset_index()
+            show_chart("4.4", charts.environment_cost_bar, env_cost)
+
+        # 4.5 Resources behind the charts: a lazy mask view, only the table columns are materialized
+        st.subheader("4.5 Matching Resources")
+        if df.empty:
+            st.write(f"🔸 {task4_cube.total(COUNT_COLUMN, where=task4_where)} resources match the current filters")
+            st.info("The matching resources can't be listed in out-of-core mode.")
+        else:
+            task4_view = FilterView(df, task4_where, tables["filter_indexes"])
+            st.write(f"🔸 {len(task4_view)} resources match the current filters")
+            if st.toggle("Show matching resources"):
+                with profiling.stage("4.5 serialize"):
+                    st.dataframe(loader.with_tag_labels(
+                        task4_view.columns([col for col in TASK4_TABLE_COLUMNS if col in df.columns])))
 
 
 # -------------------------------
 # TASK 5 — TAG REMEDIATION WORKFLOW
 # -------------------------------
-st.header("🛠️ Task Set 5 — Tag Remediation Workflow")
-st.subheader("Editable Table for All Resources") # TITLE CHANGED
-if not df.empty:
-    # --- CHANGE: Using the main DataFrame 'df' which preserves the float type for editing ---
-    edited_table = st.data_editor(df, num_rows="dynamic")
-    # -------------------------------------------------------------------------------------
-    st.download_button("⬇️ Download Updated Data", edited_table.to_csv(index=False), "updated_data.csv")
+@st.fragment
+@timed("Task Set 5")
+def task_set_5(df, n_rows, tables, remediation_store, remediation_log, source):
+    st.header("🛠️ Task Set 5 — Tag Remediation Workflow")
+    st.subheader("Editable Table for All Resources") # TITLE CHANGED
+    if not df.empty:
+        # The editor only ever holds one page. Each edit is committed straight to the remediation store
+        # as patches keyed by ResourceID (changed cells, added rows, deleted rows), and the whole
+        # dashboard reads the inventory with committed patches overlaid.
+        task5_window = window_controls("task5", df.columns)
+        previous = st.session_state.get("task5_window")
+        inventory_key = tables.version("raw")
+        if previous is None or previous["window"] != task5_window or previous["source"] != inventory_key:
+            # The shown page is snapshotted so the editor's own (position based) edits stay valid
+            # while its patches are committed and the inventory under it changes.
+            page_rows, caption = paged_rows(df, task5_window)
+            base_ids = tables["raw"]["ResourceID"]
+            added_keys = list(remediation_log.added)
+            previous = st.session_state.task5_window = {
+                "window": task5_window,
+                "source": inventory_key,
+                "editor_id": uuid4().hex[:8],
+                "shown": page_rows,
+                # Patches target the original ResourceID; rows added earlier are labelled after the
+                # base rows (EditLog.apply) and are patched by their row key
+                "keys": [base_ids[label] if label < len(base_ids) else added_keys[label - len(base_ids)]
+                         for label in page_rows.index],
+                "caption": caption,
+                "committed": [],
+            }
+        st.caption(previous["caption"])
+
+        # --- CHANGE: Using the main DataFrame 'df' which preserves the float type for editing ---
+        editor_key = f"task5_editor_{previous['editor_id']}"
+        with profiling.stage("Task 5 editor serialize"):
+            # CompletenessScore is derived from the tags, not a field of the inventory: read-only
+            st.data_editor(previous["shown"], num_rows="dynamic", key=editor_key,
+                           disabled=True if remediation_store is None else ["CompletenessScore"])
+        # -------------------------------------------------------------------------------------
+        pending = EditLog()
+        pending.record_editor(previous["keys"], st.session_state[editor_key], tables["raw"].columns,
+                              new_key_prefix=f"new-{previous['editor_id']}-")
+        new_patches = patch_delta(previous["committed"], pending.patches())
+        if new_patches and remediation_store is not None:
+            remediation_store.append(new_patches)
+            previous["committed"] = pending.patches()
+            st.rerun()  # re-read the inventory with the new patches overlaid
+        st.caption(f"{len(remediation_log)} committed change(s), saved in {store_path(accounts.state_path(source))}")
+        edited_table = df
+        download_button("⬇️ Download Updated Data", lambda: loader.with_tag_labels(edited_table), "updated_data", "updated")
+        download_button("⬇️ Download Changes Only", remediation_log.to_diff, "remediation_changes", "changes")
+    elif n_rows:
+        st.info("Editing needs the inventory in memory: turn off out-of-core mode to remediate tags.")
+    else:
+        st.info("Data is empty.")
+
+
+def show_task_set_3():
+    df = inventory_frame()
+    task_set_3(df, preview, summary, tag_fields, score_completeness(df, tables, tag_fields), tables, top_n)
+
+
+def show_task_set_5():
+    df = inventory_frame()
+    score_completeness(df, tables, tag_fields)  # the editor shows the score column too
+    task_set_5(df, n_rows, tables, remediation_store, remediation_log, csv_path)
+
+
+TASK_SETS = {
+    "📊 Data Exploration": lambda: task_set_1(preview, missing_by_column, cube, columns, n_rows, top_n),
+    "💰 Cost Visibility": lambda: task_set_2(cube, columns, n_rows, top_n),
+    "🏷️ Tagging Compliance": show_task_set_3,
+    "📈 Visualization": lambda: task_set_4(inventory_frame(), columns, task4_cube, tables),
+    "🛠️ Remediation": show_task_set_5,
+}
+
+if layout == "Tabs":
+    # on_change="rerun" makes the tabs stateful: only the open one runs its Task Set
+    for tab, show in zip(st.tabs(list(TASK_SETS), key="task_set_tab", on_change="rerun"), TASK_SETS.values()):
+        if tab.open:
+            with tab:
+                show()
 else:
-    st.info("Data is empty.")
\ No newline at end of file
+    for show in TASK_SETS.values():
+        show()
+
+# -------------------------------
+# PERFORMANCE PANEL
+# -------------------------------
+profiler.context.update(source=csv_path, rows=n_rows, layout=layout, engine=query_engine, out_of_core=out_of_core)
+profiling.finish(perf_log_path)
+
+st.sidebar.divider()
+if st.sidebar.toggle("⏱️ Performance", key="perf_panel", help=f"Stage timings of the last run (logged to {perf_log_path})."):
+    st.sidebar.toggle("Trace memory", key="perf_trace_memory",
+                      help="Record each stage's peak memory above its starting level (tracemalloc; slows the run down).")
+    last_run = profiler.to_record()
+    st.sidebar.caption(f"Last run: {last_run['seconds']:.3f} s"
+                       + (f" · peak +{last_run['peak_memory_mb']:.1f} MB" if profiler.trace_memory else ""))
+    stages = pd.DataFrame(profiler.stages, columns=["stage", "depth", "start", "seconds", "peak_memory_mb"])
+    st.sidebar.dataframe(
+        stages.assign(stage=stages["depth"].map(lambda depth: "· " * depth) + stages["stage"])
+              .drop(columns=["depth"] if profiler.trace_memory else ["depth", "peak_memory_mb"]),
+        hide_index=True,
+    )
@@ -0,0 +1 @@
+"""Data layer for the CloudMart dashboard (App.py): loading, parsing and aggregation helpers."""
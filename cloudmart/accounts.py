@@ -0,0 +1,256 @@
+"""Ingesting one inventory export per AWS account.
+
+A source is either a single CSV export, a directory of exports (``*.csv``) or
+a glob pattern (of whose matches only ``*.csv`` files are exports).  Each file is sniffed and unwrapped on its own, so wrapped and
+plain exports can be mixed.  Files are parsed in parallel by a pool of worker
+processes running the loader's command line (``python -m cloudmart.loader``):
+every worker converts its share of the files to Parquet sidecars and the
+parent only memory-maps the results, so nothing but file names crosses the
+process boundary.  (Plain subprocesses rather than ``multiprocessing``: under
+Streamlit ``__main__`` is the dashboard script, which spawned workers would
+re-run.)  The per-account frames are concatenated into one typed
+frame with an ``AccountID`` column - taken from the file name when the export
+itself doesn't carry it - and categoricals merged on the union of their
+categories.
+
+Refreshes are incremental.  A manifest next to the source
+(``<source>.manifest.json``) records, per export, its mtime, size and SHA-256
+together with its Parquet shard (the sidecar) and its partial aggregates: a
+per-file cost cube (``<name>.cube.parquet``), row count and missing counts.
+Only new files and files whose content hash changed are re-parsed; the
+global cube and counts are merged from the cached partials.
+"""
+
+import glob
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from cloudmart import loader
+from cloudmart.cube import CostCube
+
+ACCOUNT_COLUMN = "AccountID"
+
+
+def account_files(source):
+    """Export files of ``source`` (a file, a directory or a glob pattern), sorted by path.
+
+    Only ``*.csv`` files count: sidecars, partial cubes and other files derived from the
+    exports live in the same directory.
+    """
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(glob.escape(source), "*.csv")))
+    # An existing file is read as named, even if its name looks like a pattern (e.g. export[1].csv)
+    if not os.path.isfile(source) and glob.has_magic(source):
+        return sorted(path for path in glob.glob(source) if os.path.isfile(path) and path.endswith(".csv"))
+    return [source]
+
+
+def is_multi_file(source):
+    return account_files(source) != [source]
+
+
+def state_path(source):
+    """Path the files derived from ``source`` (e.g. the remediation store) are named after.
+
+    The export or directory itself, so a directory's state sits next to it rather than
+    inside; ``<directory>_<pattern>`` for a glob pattern (``acc/acct-*.csv`` ->
+    ``acc_acct-_``), again outside the globbed directory.
+    """
+    if glob.has_magic(source) and not os.path.exists(source):
+        directory, pattern = os.path.split(os.path.abspath(source))
+        name = re.sub(r"[*?\[\].]", "_", os.path.splitext(pattern)[0])
+        return re.sub(r"[*?\[\]]", "_", directory) + "_" + name
+    return os.path.normpath(source)
+
+
+def source_identity(source):
+    """(source, latest mtime_ns, total size) - changes whenever an export is rewritten, added or removed."""
+    if not is_multi_file(source):
+        return loader.file_identity(source)
+    identities = [loader.file_identity(path) for path in account_files(source)]
+    if not identities:
+        raise FileNotFoundError(f"no CSV exports found in {source!r}")
+    return source, max(mtime for _, mtime, _ in identities), sum(size for _, _, size in identities)
+
+
+def account_id(path):
+    """Account of an export that has no AccountID column: its file name."""
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def _build_sidecars(paths, max_workers=None):
+    # One worker process per batch of files; a file a worker fails on simply stays stale
+    # and is parsed in-process afterwards.
+    n_workers = min(max_workers or os.cpu_count() or 1, len(paths))
+    batches = [paths[i::n_workers] for i in range(n_workers)]
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+
+    def run(batch):
+        return subprocess.run([sys.executable, "-m", "cloudmart.loader", *batch], env=env, capture_output=True)
+
+    with ThreadPoolExecutor(n_workers) as pool:
+        list(pool.map(run, batches))
+
+
+def _with_account(df, path):
+    if ACCOUNT_COLUMN in df.columns:
+        return df
+    df = df.copy(deep=False)
+    df.insert(0, ACCOUNT_COLUMN, pd.Categorical([account_id(path)] * len(df)))
+    return df
+
+
+def concat_inventories(frames):
+    """Concatenate inventory frames, keeping categoricals (on the union of their categories)."""
+    frames = list(frames)
+    if len(frames) == 1:
+        return frames[0]
+    columns = list(dict.fromkeys(col for frame in frames for col in frame.columns))
+    merged = {}
+    for col in columns:
+        parts = [frame[col] if col in frame.columns else pd.Series(index=frame.index, dtype="object")
+                 for frame in frames]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            # Union of the categories (an all-blank column has none, of object dtype)
+            categories = pd.Index(pd.unique(pd.concat([part.cat.categories.to_series() for part in parts])))
+            dtype = pd.CategoricalDtype(categories)
+            merged[col] = pd.concat([part.astype(dtype) for part in parts], ignore_index=True)
+        else:
+            merged[col] = pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(merged)
+
+
+def load_accounts(paths, max_workers=None):
+    """Parse the exports at ``paths`` in parallel and concatenate them into one frame."""
+    paths = list(paths)
+    stale = [path for path in paths if not loader.sidecar_is_fresh(path)]
+    if len(stale) > 1:
+        _build_sidecars(stale, max_workers)
+    # Fresh sidecars are memory-mapped; whatever is left is parsed here (e.g. read-only location)
+    frames = [_with_account(loader.load_inventory(path), path) for path in paths]
+    return concat_inventories(frames)
+
+
+def file_hash(path, block_size=loader.READ_BLOCK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        while block := fh.read(block_size):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def manifest_path(source):
+    return state_path(source) + ".manifest.json"
+
+
+def partials_path(path):
+    """Per-file cost cube kept next to the export at ``path``."""
+    return os.path.splitext(path)[0] + ".cube.parquet"
+
+
+class AccountManifest:
+    """Per-export record of content hash, Parquet shard and partial aggregates."""
+
+    def __init__(self, source):
+        self.path = manifest_path(source)
+        try:
+            with open(self.path, encoding="utf-8") as fh:
+                self.entries = json.load(fh)
+        except (OSError, ValueError):
+            self.entries = {}
+        self._touched = False
+
+    def _is_current(self, path, entry):
+        if entry is None or not (os.path.exists(entry["shard"]) and os.path.exists(entry["partials"])):
+            return False
+        _, mtime_ns, size = loader.file_identity(path)
+        if (entry["mtime_ns"], entry["size"]) == (mtime_ns, size):
+            return True
+        if entry["size"] != size or entry["sha256"] != file_hash(path):
+            return False
+        # Rewritten with the same content: keep the shard, and make it count as fresh again
+        entry["mtime_ns"] = mtime_ns
+        loader.restamp_sidecar(path)
+        self._touched = True
+        return True
+
+    def refresh(self, paths, max_workers=None):
+        """Bring the manifest up to date with ``paths``; returns the exports that were re-parsed."""
+        paths = [os.path.abspath(path) for path in paths]
+        changed = [path for path in paths if not self._is_current(path, self.entries.get(path))]
+        # A changed export always gets a new shard, whatever state its old sidecar is in
+        if len(changed) > 1:
+            _build_sidecars(changed, max_workers)
+        elif changed:
+            try:
+                loader.write_sidecar(changed[0])
+            except OSError:
+                pass  # read-only location: parsed from the CSV below
+        for path in changed:
+            df = _with_account(loader.load_inventory(path), path)
+            cube = CostCube.from_inventory(df)
+            cube.frame.to_parquet(partials_path(path), index=False)
+            _, mtime_ns, size = loader.file_identity(path)
+            self.entries[path] = {
+                "mtime_ns": mtime_ns,
+                "size": size,
+                "sha256": file_hash(path),
+                "shard": loader.sidecar_path(path),
+                "partials": partials_path(path),
+                "dimensions": cube.dimensions,
+                "rows": len(df),
+                "missing": {col: int(n) for col, n in df.isnull().sum().items()},
+            }
+        removed = set(self.entries) - set(paths)
+        for path in removed:
+            del self.entries[path]
+        if changed or removed or self._touched:
+            self.save()
+            self._touched = False
+        return changed
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(self.entries, fh, indent=1)
+        os.replace(tmp, self.path)
+
+    def cube(self):
+        """Global cost cube, merged from the per-file partial cubes."""
+        return CostCube.combine(
+            CostCube(pd.read_parquet(entry["partials"]), entry["dimensions"]) for entry in self.entries.values()
+        )
+
+    def missing_counts(self):
+        """Missing values per column, summed over the exports (``df.isnull().sum()``)."""
+        entries = list(self.entries.values())
+        columns = dict.fromkeys(col for entry in entries for col in entry["missing"])
+        return pd.Series({col: sum(entry["missing"].get(col, 0) for entry in entries) for col in columns},
+                         dtype="int64")
+
+
+def refresh_source(source, max_workers=None):
+    """The manifest of a multi-file ``source``, refreshed (re-parsing changed exports only)."""
+    paths = account_files(source)
+    if not paths:
+        raise FileNotFoundError(f"no CSV exports found in {source!r}")
+    manifest = AccountManifest(source)
+    manifest.refresh(paths, max_workers)
+    return manifest
+
+
+def load_source(source):
+    """The inventory of ``source``: one export as is, several concatenated (``load_accounts``)."""
+    if not is_multi_file(source):
+        return loader.load_inventory(source)
+    refresh_source(source)
+    # Every shard is fresh now: the exports are only memory-mapped and concatenated
+    return load_accounts(account_files(source))
@@ -0,0 +1,55 @@
+"""Plotly figures for the dashboard, built from pre-aggregated data only.
+
+Every builder takes one row per plotted category (counts or cost totals, as
+returned by ``CostCube.rollup``) and refuses frames with repeated keys, so a
+figure's data payload stays proportional to the number of categories - never
+to the number of resources, as it would if raw rows were handed to Plotly to
+count client-side.
+"""
+
+import pandas as pd
+import plotly.express as px
+
+from cloudmart.cube import COUNT_COLUMN
+from cloudmart.loader import COST_COLUMN, TAGGED_LABELS
+
+
+def _aggregated(frame, keys):
+    # One row per key combination; anything else means raw rows slipped through
+    if frame.duplicated(subset=keys).any():
+        raise ValueError(f"chart data must be pre-aggregated: repeated {keys} values")
+    frame = frame.copy()
+    for key in keys:
+        if key == "Tagged":
+            frame[key] = frame[key].map(TAGGED_LABELS)
+        elif isinstance(frame[key].dtype, pd.CategoricalDtype):
+            # Unobserved categories would otherwise become empty traces/legend entries
+            frame[key] = frame[key].cat.remove_unused_categories()
+    return frame
+
+
+def tag_compliance_pie(counts):
+    """Pie of resources per Tagged status; ``counts`` has Tagged and Resources columns."""
+    counts = _aggregated(counts, ["Tagged"])
+    return px.pie(counts, names="Tagged", values=COUNT_COLUMN, title="Tag Compliance")
+
+
+def department_cost_bar(totals):
+    """Grouped bar of cost per Department and Tagged status."""
+    totals = _aggregated(totals, ["Department", "Tagged"])
+    return px.bar(totals, x="Department", y=COST_COLUMN, color="Tagged", barmode="group",
+                  title="Total Monthly Cost by Department and Tag Status")
+
+
+def service_cost_bar(totals):
+    """Horizontal bar of cost per Service."""
+    totals = _aggregated(totals, ["Service"])
+    return px.bar(totals, x=COST_COLUMN, y="Service", orientation="h",
+                  title="Total Monthly Cost by Service")
+
+
+def environment_cost_bar(totals):
+    """Bar of cost per Environment."""
+    totals = _aggregated(totals, ["Environment"])
+    return px.bar(totals, x="Environment", y=COST_COLUMN, color="Environment",
+                  title="Total Monthly Cost by Environment")
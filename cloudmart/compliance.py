@@ -0,0 +1,55 @@
+"""Tag completeness scoring.
+
+Each resource gets a single ``uint8`` bitmask with one bit per required tag
+field (bit ``i`` set = ``fields[i]`` is missing).  The completeness score, the
+missing-field histogram and the incomplete-resource filter are all derived
+from that one array instead of from separate boolean frames.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cloudmart.filters import POPCOUNT
+
+TAG_FIELDS = ["Department", "Project", "Environment", "Owner", "CostCenter", "CreatedBy"]
+
+
+def missing_bitmask(df, fields):
+    """Per-row bitmask of the missing ``fields`` (at most 8)."""
+    if len(fields) > 8:
+        raise ValueError("at most 8 tag fields fit in a uint8 bitmask")
+    mask = np.zeros(len(df), dtype=np.uint8)
+    for bit, col in enumerate(fields):
+        mask |= df[col].isna().to_numpy(dtype=np.uint8) << np.uint8(bit)
+    return mask
+
+
+def completeness_score(mask, n_fields):
+    """Number of present tag fields per row."""
+    return np.uint8(n_fields) - POPCOUNT[mask]
+
+
+def mask_histogram(mask):
+    """Number of rows per mask value (256 bins); histograms of chunks simply add up."""
+    return np.bincount(mask, minlength=256)
+
+
+def histogram_counts(histogram, fields):
+    """How many rows miss each field, from a ``mask_histogram``."""
+    values = np.arange(256)
+    counts = [int(histogram[(values >> bit) & 1 == 1].sum()) for bit in range(len(fields))]
+    return pd.Series(counts, index=fields, dtype="int64")
+
+
+def bits_for(fields, selected):
+    """Bitmask with the bits of the ``selected`` fields set."""
+    return sum(1 << fields.index(col) for col in selected)
+
+
+def rows_missing(mask, bits=0, exact=False):
+    """Rows missing at least the ``bits`` fields (``exact``: exactly those); ``bits=0``: any field."""
+    if not bits:
+        return mask != 0
+    if exact:
+        return mask == bits
+    return (mask & np.uint8(bits)) == bits
@@ -0,0 +1,95 @@
+"""Pre-aggregated cost cube over the CloudMart inventory.
+
+The dashboard's cost questions are all group-by-sum (or count) queries over a
+handful of low-cardinality tag columns.  ``CostCube`` scans the inventory once
+and keeps, per combination of ``CUBE_DIMENSIONS``, the summed monthly cost and
+the number of resources.  Every section then answers from that (small) table
+with ``rollup`` instead of grouping the full resource frame again.
+"""
+
+import pandas as pd
+
+from cloudmart.loader import COST_COLUMN
+
+CUBE_DIMENSIONS = ["Department", "Project", "Environment", "Service", "Region", "Tagged"]
+COUNT_COLUMN = "Resources"
+MEASURES = [COST_COLUMN, COUNT_COLUMN]
+
+
+class CostCube:
+    """Cost sum and resource count per combination of ``dimensions``.
+
+    ``frame`` holds one row per observed combination (missing tag values are kept
+    as their own NaN/NA group) with the dimension columns plus ``MEASURES``.
+    """
+
+    def __init__(self, frame, dimensions):
+        self.frame = frame
+        self.dimensions = list(dimensions)
+
+    @classmethod
+    def from_inventory(cls, df, dimensions=CUBE_DIMENSIONS):
+        """Build the cube in a single group-by pass over ``df``."""
+        dimensions = [col for col in dimensions if col in df.columns]
+        grouped = df.groupby(dimensions, observed=True, dropna=False, sort=False)[COST_COLUMN]
+        frame = grouped.agg(**{COST_COLUMN: "sum", COUNT_COLUMN: "size"}).reset_index()
+        return cls(frame, dimensions)
+
+    @classmethod
+    def combine(cls, cubes):
+        """Merge cubes over the same dimensions (e.g. built from separate chunks of the inventory)."""
+        cubes = list(cubes)
+        dimensions = cubes[0].dimensions
+        frame = pd.concat([cube.frame for cube in cubes], ignore_index=True)
+        grouped = frame.groupby(dimensions, observed=True, dropna=False, sort=False)
+        return cls(grouped[MEASURES].sum().reset_index(), dimensions)
+
+    def apply_delta(self, removed=(), added=()):
+        """The cube with the ``removed`` rows taken out and the ``added`` rows put in.
+
+        Both are iterables of inventory frames (e.g. resources before and after an edit), so
+        keeping the cube current costs a group-by over the changed rows and one pass over the
+        (small) cube instead of a new scan of the inventory.  Combinations left without any
+        resource are dropped.
+        """
+        parts = [self]
+        for frames, sign in ((removed, -1), (added, 1)):
+            for frame in frames:
+                if len(frame):
+                    part = CostCube.from_inventory(frame, self.dimensions)
+                    part.frame[MEASURES] = part.frame[MEASURES] * sign
+                    parts.append(part)
+        if len(parts) == 1:
+            return self
+        frame = CostCube.combine(parts).frame
+        return CostCube(frame[frame[COUNT_COLUMN] != 0].reset_index(drop=True), self.dimensions)
+
+    def project(self, dimensions):
+        """Roll the cube up onto a subset of its dimensions (still keeping missing values)."""
+        dimensions = [dim for dim in dimensions if dim in self.dimensions]
+        grouped = self.frame.groupby(dimensions, observed=True, dropna=False, sort=False)
+        return CostCube(grouped[MEASURES].sum().reset_index(), dimensions)
+
+    def values(self, dim):
+        """Distinct non-missing values of ``dim``, in order of first appearance."""
+        return self.frame[dim].dropna().unique()
+
+    def select(self, where=None):
+        """Cube rows matching ``where`` ({dimension: allowed values}; empty selections are ignored)."""
+        frame = self.frame
+        for dim, values in (where or {}).items():
+            if values is not None and len(values):
+                frame = frame[frame[dim].isin(values)]
+        return frame
+
+    def rollup(self, by, where=None, dropna=True):
+        """Sum the measures over ``by`` for the cube rows matching ``where``.
+
+        With ``dropna=True`` (the pandas groupby default) resources whose ``by`` value
+        is missing are left out, exactly as grouping the raw inventory would.
+        """
+        frame = self.select(where)
+        return frame.groupby(by, observed=True, dropna=dropna)[MEASURES].sum()
+
+    def total(self, measure=COST_COLUMN, where=None):
+        return self.select(where)[measure].sum()
@@ -0,0 +1,122 @@
+"""Versioned dependency graph of the dashboard's derived tables.
+
+Every derived dataset (the patched inventory, the missing-tag mask, the cost
+cube, ...) is a named node that declares its inputs: other nodes, or *sources*
+- plain hashable versions supplied by the caller, such as the export's file
+identity or the remediation store's patch number.  A node's version is the
+versions of its inputs; its value is kept together with the version it was
+computed for and recomputed only when that changes.  Pulling a node computes
+just what it depends on, so unrelated tables are never built.
+
+    tables = TableGraph()
+
+    @tables.table("cube", ["inventory"])
+    def cube(inventory):
+        return CostCube.from_inventory(inventory)
+
+    tables.at(files=identity)["cube"]
+
+Each node keeps its values for the few versions pulled most recently (an LRU
+keyed by version), so sessions looking at different versions at once - one on
+the pandas engine and one on DuckDB, or a fragment still showing an older patch
+number - don't evict each other's tables on every rerun.
+
+The graph is shared by every session.  A cached value is returned without
+waiting on anything being computed; a missing one is computed once, under a
+lock of its own node, while the other sessions keep reading the other tables.
+"""
+
+import collections
+import contextlib
+import threading
+
+# Versions kept per node
+KEEP_VERSIONS = 4
+
+
+class TableGraph:
+    """Named derived tables and the inputs they are computed from."""
+
+    def __init__(self, observer=None, keep=KEEP_VERSIONS):
+        self._nodes = {}  # name -> (inputs, compute, keep)
+        self._values = collections.defaultdict(collections.OrderedDict)  # name -> {version: value}, oldest first
+        self._keep = keep
+        # observer(name) -> context manager wrapped around every (re)computation
+        self._observer = observer or (lambda name: contextlib.nullcontext())
+        # Guards the caches only (held for a lookup or an insert, never during a computation)
+        self._values_lock = threading.Lock()
+        # One computation per node at a time: sessions needing the same version wait for it and then
+        # find it cached, while other nodes are pulled and computed concurrently
+        self._compute_locks = {}
+
+    def table(self, name, inputs=(), keep=None):
+        """Decorator registering ``compute(*input values)`` as the node ``name``.
+
+        ``keep`` overrides how many versions of the node are kept (e.g. 2 for large tables).
+        """
+        def register(compute):
+            self._nodes[name] = (tuple(inputs), compute, keep or self._keep)
+            self._compute_locks[name] = threading.Lock()
+            return compute
+        return register
+
+    def version(self, name, sources):
+        if name in sources:
+            return sources[name]
+        if name not in self._nodes:
+            raise KeyError(f"unknown table or missing source {name!r}")
+        inputs = self._nodes[name][0]
+        return tuple(self.version(dep, sources) for dep in inputs)
+
+    def _cached(self, name, version):
+        with self._values_lock:
+            cached = self._values[name]
+            if version not in cached:
+                return False, None
+            cached.move_to_end(version)
+            return True, cached[version]
+
+    def get(self, name, sources):
+        if name in sources:
+            return sources[name]
+        version = self.version(name, sources)
+        found, value = self._cached(name, version)
+        if found:
+            return value
+        inputs, compute, keep = self._nodes[name]
+        # Inputs are pulled before taking this node's lock, so a node lock is never held while waiting on another
+        values = [self.get(dep, sources) for dep in inputs]
+        with self._compute_locks[name]:
+            # Another session may have computed it while this one waited
+            found, value = self._cached(name, version)
+            if found:
+                return value
+            with self._observer(name):
+                value = compute(*values)
+            with self._values_lock:
+                cached = self._values[name]
+                cached[version] = value
+                while len(cached) > keep:
+                    cached.popitem(last=False)
+            return value
+
+    def at(self, **sources):
+        return Snapshot(self, sources)
+
+
+class Snapshot:
+    """The graph as seen with one set of source versions (e.g. one rerun)."""
+
+    def __init__(self, graph, sources):
+        self.graph = graph
+        self.sources = dict(sources)
+
+    def __getitem__(self, name):
+        return self.graph.get(name, self.sources)
+
+    def version(self, name):
+        return self.graph.version(name, self.sources)
+
+    def at(self, **sources):
+        """This snapshot with more (or updated) sources."""
+        return Snapshot(self.graph, {**self.sources, **sources})
@@ -0,0 +1,228 @@
+"""Delta-only tracking of remediation edits.
+
+Instead of keeping an edited copy of the whole inventory, ``EditLog`` records
+only what changed, keyed by ResourceID:
+
+* ``cells``   - {column: {ResourceID: new value}}
+* ``added``   - {row key: {column: value}} for rows created in the editor
+* ``deleted`` - ResourceIDs removed in the editor
+
+A patch on a ResourceID applies to every row carrying it.  The log is applied
+lazily, to whatever slice of the base data is being shown or exported.
+
+As patches, the log is a list of ``(op, key, column, value)`` tuples with op
+``set`` (one cell), ``add`` (value is the whole new row) or ``delete``.
+"""
+
+import json
+
+import numpy as np
+import pandas as pd
+
+KEY_COLUMN = "ResourceID"
+DIFF_COLUMNS = ["Op", KEY_COLUMN, "Column", "Value"]
+
+
+class EditLog:
+    """Patch log of cell edits, added rows and deleted rows against the base inventory."""
+
+    def __init__(self):
+        self.cells = {}
+        self.added = {}
+        self.deleted = set()
+
+    def __len__(self):
+        return sum(len(updates) for updates in self.cells.values()) + len(self.added) + len(self.deleted)
+
+    def set_cell(self, key, column, value):
+        if key in self.added:
+            self.added[key][column] = value
+        else:
+            self.cells.setdefault(column, {})[key] = value
+
+    def add_row(self, key, row):
+        self.added[key] = dict(row)
+
+    def delete(self, key):
+        if self.added.pop(key, None) is None:
+            self.deleted.add(key)
+
+    def apply_patch(self, op, key, column=None, value=None):
+        if op == "set":
+            self.set_cell(key, column, value)
+        elif op == "add":
+            self.add_row(key, value)
+        elif op == "delete":
+            self.delete(key)
+        else:
+            raise ValueError(f"unknown patch op {op!r}")
+
+    def patches(self):
+        """The log as ``(op, key, column, value)`` tuples; replaying them rebuilds it."""
+        patches = [("add", key, None, row) for key, row in self.added.items()]
+        for col, updates in self.cells.items():
+            patches.extend(("set", key, col, value) for key, value in updates.items())
+        patches.extend(("delete", key, None, None) for key in sorted(self.deleted))
+        return patches
+
+    def record_editor(self, keys, state, columns, new_key_prefix="new-"):
+        """Record a ``st.data_editor`` state (position based) for a page whose rows have ``keys``.
+
+        ``keys`` holds, per displayed position, the ResourceID (or added-row key) it shows.
+        Rows added in the editor are keyed ``<new_key_prefix><n>``, so they never collide
+        with an existing ResourceID.  Only ``columns`` are recorded: edits to any other
+        (derived) column shown in the editor are ignored.
+        """
+        for position, changes in state.get("edited_rows", {}).items():
+            for column, value in changes.items():
+                if column in columns:
+                    self.set_cell(keys[int(position)], column, value)
+        for i, row in enumerate(state.get("added_rows", [])):
+            row = {col: row.get(col) for col in columns}
+            self.add_row(f"{new_key_prefix}{i}", row)
+        for position in state.get("deleted_rows", []):
+            self.delete(keys[int(position)])
+
+    def apply(self, frame, include_added=True):
+        """``frame`` (a slice of the base inventory) with the log applied.
+
+        Added rows are appended in ``added`` order, labelled from ``frame.index.max() + 1`` on.
+        """
+        start = frame.index.max() + 1 if len(frame) else 0
+        if self.deleted:
+            frame = frame[~frame[KEY_COLUMN].isin(self.deleted)]
+        touched = {col: updates for col, updates in self.cells.items() if col in frame.columns and updates}
+        if touched:
+            frame = frame.copy()
+            for col, updates in touched.items():
+                mask = frame[KEY_COLUMN].isin(list(updates))
+                if mask.any():
+                    values = frame.loc[mask, KEY_COLUMN].map(updates)
+                    frame[col] = _with_categories(frame[col], values)
+                    frame.loc[mask, col] = values.to_numpy()
+        if include_added and self.added:
+            index = pd.RangeIndex(start, start + len(self.added))
+            added = pd.DataFrame(list(self.added.values()), index=index, columns=frame.columns)
+            frame = concat_rows(frame, added)
+        return frame
+
+    def edited_keys(self):
+        """ResourceIDs of the base rows the log changes (edited cells or deleted)."""
+        keys = set(self.deleted)
+        for updates in self.cells.values():
+            keys.update(updates)
+        return keys
+
+    def changes(self, base, key_index):
+        """What the log does to ``base``, as ``(before, after, added)`` row frames.
+
+        ``before`` holds the rows of ``base`` carrying an edited or deleted ResourceID, located
+        through ``key_index`` (``base``'s ResourceIDs as a ``pd.Index``) without scanning
+        ``base``; ``after`` is the same rows with the log applied (deleted rows dropped) and
+        ``added`` the added rows.  An aggregate of ``base`` is brought up to date with the log
+        by taking ``before`` out and putting ``after`` and ``added`` in.
+        """
+        positions = key_index.get_indexer_for(list(self.edited_keys()))
+        before = base.iloc[np.sort(positions[positions >= 0])]
+        return before, self.apply(before, include_added=False), self.apply(base.iloc[:0])
+
+    def apply_changes(self, base, changes):
+        """``self.apply(base)``, built from ``changes(base, key_index)`` instead of a scan of ``base``.
+
+        Only the edited columns are copied, and only the edited rows are written into them.
+        """
+        before, after, added = changes
+        frame = base.copy(deep=False)
+        for col, updates in self.cells.items():
+            if col in frame.columns and updates and len(after):
+                frame[col] = _with_categories(frame[col], after[col])
+                frame.loc[after.index, col] = after[col].to_numpy()
+        deleted = before.index.difference(after.index)
+        if len(deleted):
+            frame = frame.drop(index=deleted)
+        if len(added):
+            start = base.index.max() + 1 if len(base) else 0
+            frame = concat_rows(frame, added.set_axis(pd.RangeIndex(start, start + len(added))))
+        return frame
+
+    def to_diff(self):
+        """The log as a small frame: one row per changed cell, added row or deleted resource."""
+        rows = [("delete", key, None, None) for key in sorted(self.deleted)]
+        for key, row in self.added.items():
+            rows.extend(("add", row.get(KEY_COLUMN) or key, col, value) for col, value in row.items() if value is not None)
+        for col, updates in self.cells.items():
+            rows.extend(("update", key, col, value) for key, value in updates.items())
+        return pd.DataFrame(rows, columns=DIFF_COLUMNS)
+
+
+def patch_values(values, changes, compute):
+    """Per-row ``values`` of the base inventory brought up to ``changes`` (``EditLog.changes``).
+
+    ``compute(rows)`` gives the values of a frame of rows: the edited rows are recomputed in
+    place, deleted rows dropped and added rows appended, as ``EditLog.apply`` lays them out.
+    """
+    before, after, added = changes
+    values = values.copy()
+    values[after.index] = compute(after)
+    return np.concatenate([np.delete(values, before.index.difference(after.index)), compute(added)])
+
+
+def patch_positions(positions, n_rows, changes, select):
+    """Sorted positions of the base rows picked by ``select``, brought up to ``changes``.
+
+    ``positions`` are those of the ``n_rows`` base rows; ``select(rows)`` is the boolean pick
+    of a frame of rows.  The result indexes the inventory with the log applied (``EditLog.apply``).
+    """
+    before, after, added = changes
+    edited = before.index.to_numpy()
+    at = np.searchsorted(positions, edited)
+    found = at < len(positions)
+    found[found] = positions[at[found]] == edited[found]
+    positions = np.delete(positions, at[found])
+    picked = after.index.to_numpy()[select(after)]
+    positions = np.insert(positions, np.searchsorted(positions, picked), picked)
+    deleted = before.index.difference(after.index).to_numpy()
+    if len(deleted):
+        positions = positions - np.searchsorted(deleted, positions)
+    return np.concatenate([positions, n_rows - len(deleted) + np.flatnonzero(select(added))])
+
+
+def _patch_id(patch):
+    return json.dumps(patch, default=str, sort_keys=True)
+
+
+def patch_delta(before, after):
+    """Patches to append to a log that already holds ``before`` so it reflects ``after``.
+
+    Both are patch lists recorded from the same editor; rows that were added and then
+    removed again get a ``delete``.
+    """
+    seen = {_patch_id(patch) for patch in before}
+    delta = [patch for patch in after if _patch_id(patch) not in seen]
+    still_added = {key for op, key, _, _ in after if op == "add"}
+    delta.extend(("delete", key, None, None) for op, key, _, _ in before if op == "add" and key not in still_added)
+    return delta
+
+
+def _with_categories(column, values):
+    # Categoricals only accept known categories: extend them with any new edited values
+    if not isinstance(column.dtype, pd.CategoricalDtype):
+        return column
+    new = pd.Index(values.dropna().unique()).difference(column.cat.categories)
+    return column.cat.add_categories(new) if len(new) else column
+
+
+def concat_rows(frame, added):
+    """Append ``added`` rows to ``frame``, keeping categorical and boolean dtypes."""
+    added = added.copy()
+    for col in frame.columns:
+        dtype = frame[col].dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            frame = frame.assign(**{col: _with_categories(frame[col], added[col])})
+            added[col] = added[col].astype(frame[col].dtype)
+        else:
+            try:
+                added[col] = added[col].astype(dtype)
+            except (TypeError, ValueError):
+                pass  # e.g. text typed into a numeric column: let concat upcast
+    return pd.concat([frame, added])
@@ -0,0 +1,70 @@
+"""File exports for the download buttons.
+
+Exports are generated only when a download is actually requested (the
+dashboard hands ``st.download_button`` a callable).  CSV is written in
+fixed-size row chunks - optionally through a gzip or zstd compressor - into a
+spooled temporary file, so the full CSV text never exists as one string in
+memory; Parquet is written column-wise.  The finished file is returned as
+bytes, which ``st.download_button`` accepts from a callable.
+"""
+
+import gzip
+import io
+import tempfile
+
+try:
+    import zstandard
+except ImportError:  # optional: zstd exports are offered only when it is installed
+    zstandard = None
+
+CHUNK_ROWS = 100_000
+# Keep exports up to this size in memory, spill larger ones to disk
+SPOOL_BYTES = 64 * 1024 * 1024
+
+# label -> (file extension, MIME type)
+EXPORT_FORMATS = {
+    "CSV": ("csv", "text/csv"),
+    "CSV (gzip)": ("csv.gz", "application/gzip"),
+    "Parquet": ("parquet", "application/vnd.apache.parquet"),
+}
+if zstandard is not None:
+    EXPORT_FORMATS["CSV (zstd)"] = ("csv.zst", "application/zstd")
+
+
+def file_name(stem, fmt):
+    return f"{stem}.{EXPORT_FORMATS[fmt][0]}"
+
+
+def mime_type(fmt):
+    return EXPORT_FORMATS[fmt][1]
+
+
+def _write_csv(df, binary, chunk_rows):
+    text = io.TextIOWrapper(binary, encoding="utf-8", newline="")
+    for start in range(0, max(len(df), 1), chunk_rows):
+        df.iloc[start:start + chunk_rows].to_csv(text, index=False, header=start == 0)
+    text.flush()
+    text.detach()
+
+
+def export(df, fmt, chunk_rows=CHUNK_ROWS):
+    """``df`` serialized as ``fmt`` (a key of ``EXPORT_FORMATS``), as bytes."""
+    with tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES) as out:
+        _write(df, fmt, out, chunk_rows)
+        out.seek(0)
+        return out.read()
+
+
+def _write(df, fmt, out, chunk_rows):
+    if fmt == "CSV":
+        _write_csv(df, out, chunk_rows)
+    elif fmt == "CSV (gzip)":
+        with gzip.GzipFile(fileobj=out, mode="wb") as compressed:
+            _write_csv(df, compressed, chunk_rows)
+    elif fmt == "CSV (zstd)":
+        with zstandard.ZstdCompressor().stream_writer(out, closefd=False) as compressed:
+            _write_csv(df, compressed, chunk_rows)
+    elif fmt == "Parquet":
+        df.to_parquet(out, index=False)
+    else:
+        raise ValueError(f"unknown export format {fmt!r}")
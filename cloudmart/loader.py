@@ -0,0 +1,294 @@
+"""Reading the CloudMart inventory export into a DataFrame.
+
+The export comes in two layouts:
+
+* ``plain``   - a regular CSV, one field per column.
+* ``wrapped`` - every row (header included) is quoted as a single field, e.g.
+  ``"1001,i-001,EC2,us-east-1,..."``.  pandas reads that as one column.
+
+The wrapped layout is decoded in a single streaming pass: the outer quotes are
+stripped at the byte level while pandas' C parser consumes the stream, so the
+rows are parsed straight into typed columns without an intermediate
+single-column frame.
+
+Columns are typed from ``INVENTORY_SCHEMA``: low-cardinality tag columns load
+as ``category``, ``Tagged`` as a nullable ``boolean`` and the cost as
+``float64``.  Columns not in the schema are read as strings.
+
+Parsing text is the slow part of a cold start, so ``load_inventory`` keeps a
+Parquet sidecar next to the CSV (``<name>.parquet``).  The sidecar records the
+size and mtime of the CSV it was built from in its schema metadata; while they
+still match the CSV it is read instead, memory-mapped.  (Comparing mtimes alone
+would keep serving an export that was replaced by a copy with its old mtime.)
+``python -m cloudmart.loader <csv>...`` builds it ahead of time.
+"""
+
+import io
+import json
+import os
+import sys
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cloudmart import profiling
+
+BOM = b"\xef\xbb\xbf"
+COST_COLUMN = "MonthlyCostUSD"
+READ_BLOCK_SIZE = 1 << 20
+# Schema metadata key of the sidecar holding the identity of its source CSV
+SOURCE_KEY = b"cloudmart.source"
+
+INVENTORY_SCHEMA = {
+    "AccountID": "category",
+    "ResourceID": "str",
+    "Service": "category",
+    "Region": "category",
+    "Department": "category",
+    "Project": "category",
+    "Environment": "category",
+    "Owner": "str",
+    "CostCenter": "category",
+    "CreatedBy": "category",
+    COST_COLUMN: "float64",
+    "Tagged": "boolean",
+}
+
+# Tagged is stored as a boolean; the export (and the downloads) spell it Yes/No
+TAGGED_VALUES = {"yes": True, "true": True, "no": False, "false": False}
+TAGGED_LABELS = {True: "Yes", False: "No"}
+
+
+def file_identity(path):
+    """(absolute path, mtime_ns, size) - changes whenever the file is rewritten or replaced."""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_mtime_ns, stat.st_size
+
+
+def _clean_header(line):
+    text = line.decode("utf-8").replace("\ufeff", "")
+    return [col.strip() for col in text.split(",")]
+
+
+def _is_wrapped(line):
+    # The whole line is one quoted field: opening and closing quote, and every
+    # quote in between is an escaped pair ("").
+    if len(line) < 2 or not (line.startswith(b'"') and line.endswith(b'"')):
+        return False
+    return b'"' not in line[1:-1].replace(b'""', b"")
+
+
+def sniff(path):
+    """Return ``(layout, header)`` for the export at ``path``."""
+    with open(path, "rb") as fh:
+        first = fh.readline()
+    first = first.removeprefix(BOM).rstrip(b"\r\n")
+    if _is_wrapped(first):
+        return "wrapped", _clean_header(first[1:-1].replace(b'""', b'"'))
+    return "plain", _clean_header(first)
+
+
+def _unwrap_block(block):
+    # ``block`` starts at a line boundary and holds whole lines only.
+    if b'""' not in block:
+        # No escaped quotes: every quote is an outer one, delete them all in one pass
+        return block.translate(None, b'"')
+    if block.startswith(b'"'):
+        block = block[1:]
+    block = block.replace(b'"\r\n', b"\r\n").replace(b'"\n', b"\n").replace(b'\n"', b"\n")
+    return block.replace(b'""', b'"')
+
+
+class UnwrappedRows(io.RawIOBase):
+    """Binary stream over a wrapped-layout export that yields the rows as plain CSV."""
+
+    def __init__(self, raw, block_size=READ_BLOCK_SIZE):
+        self._raw = raw
+        self._block_size = block_size
+        self._carry = b""
+        self._out = memoryview(b"")
+        self._eof = False
+        head = raw.read(len(BOM))
+        if head != BOM:
+            self._carry = head
+
+    def readable(self):
+        return True
+
+    def _fill(self):
+        while not self._out and not self._eof:
+            block = self._raw.read(self._block_size)
+            if not block:
+                # Last line has no trailing newline: drop its closing quote by hand
+                self._eof = True
+                tail = self._carry.rstrip(b"\r")
+                if tail.endswith(b'"'):
+                    tail = tail[:-1]
+                self._out = memoryview(_unwrap_block(tail))
+                self._carry = b""
+                break
+            block = self._carry + block
+            cut = block.rfind(b"\n") + 1
+            self._carry = block[cut:]
+            if cut:
+                self._out = memoryview(_unwrap_block(block[:cut]))
+
+    def readinto(self, buffer):
+        self._fill()
+        n = min(len(buffer), len(self._out))
+        buffer[:n] = self._out[:n]
+        self._out = self._out[n:]
+        return n
+
+    def close(self):
+        self._raw.close()
+        super().close()
+
+
+def open_rows(path, layout):
+    """Open ``path`` as a binary CSV stream, unwrapping rows if needed."""
+    raw = open(path, "rb")
+    if layout == "wrapped":
+        return io.BufferedReader(UnwrappedRows(raw), buffer_size=READ_BLOCK_SIZE)
+    return raw
+
+
+def _blank_to_nan(df):
+    # Empty fields are already NaN; whitespace-only fields are treated as missing too.
+    # For categoricals only the (few) categories need checking.
+    for col in df.columns:
+        values = df[col]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            blank = categories[categories.str.isspace()]
+            if len(blank):
+                df[col] = values.cat.remove_categories(blank)
+        elif pd.api.types.is_string_dtype(values.dtype):
+            blank = values.str.isspace()
+            if blank.any():
+                df[col] = values.mask(blank.fillna(False).astype(bool))
+    return df
+
+
+def _parse_tagged(values):
+    # Read as a categorical, then map the handful of categories: Yes/No (and True/False,
+    # as written by pandas) become booleans, anything else is missing.
+    codes = values.cat.codes.to_numpy()
+    lookup = [TAGGED_VALUES.get(str(cat).strip().lower()) for cat in values.cat.categories]
+    flags = pd.array(lookup + [None], dtype="boolean")
+    return pd.Series(flags[codes], index=values.index, name=values.name)
+
+
+def read_dtypes(header):
+    """read_csv dtypes for ``header``; Tagged is read as category and converted afterwards."""
+    dtypes = {col: INVENTORY_SCHEMA.get(col, "str") for col in header}
+    if "Tagged" in dtypes:
+        dtypes["Tagged"] = "category"
+    return dtypes
+
+
+def apply_schema(df):
+    """Finish typing a frame read with ``read_dtypes``."""
+    df = _blank_to_nan(df)
+    if "Tagged" in df.columns:
+        df["Tagged"] = _parse_tagged(df["Tagged"])
+    return df
+
+
+def with_tag_labels(df):
+    """Copy of ``df`` with Tagged spelled Yes/No again, for display and CSV export."""
+    if "Tagged" not in df.columns:
+        return df
+    return df.assign(Tagged=df["Tagged"].map(TAGGED_LABELS).astype("category"))
+
+
+def read_inventory(path):
+    """Parse a CloudMart export (either layout) into a DataFrame typed by ``INVENTORY_SCHEMA``."""
+    with profiling.stage("CSV sniff"):
+        layout, header = sniff(path)
+    # Rows are split out of their quotes while being streamed into the parser: one stage
+    with profiling.stage("CSV read + split"), open_rows(path, layout) as stream:
+        df = pd.read_csv(stream, header=0, names=header, dtype=read_dtypes(header), encoding="utf-8")
+    with profiling.stage("CSV clean"):
+        return apply_schema(df)
+
+
+def sidecar_path(path):
+    """Parquet file kept next to the CSV export at ``path``."""
+    return os.path.splitext(path)[0] + ".parquet"
+
+
+def source_stamp(path):
+    """What the sidecar records of the CSV at ``path``: its size and mtime_ns."""
+    _, mtime_ns, size = file_identity(path)
+    return {"size": size, "mtime_ns": mtime_ns}
+
+
+def sidecar_stamp(path):
+    """The ``source_stamp`` the sidecar of ``path`` was built from (None without a readable one)."""
+    try:
+        metadata = pq.read_schema(sidecar_path(path)).metadata or {}
+    except (OSError, pa.ArrowException):
+        return None
+    return json.loads(metadata[SOURCE_KEY]) if SOURCE_KEY in metadata else None
+
+
+def sidecar_is_fresh(path):
+    return sidecar_stamp(path) == source_stamp(path)
+
+
+def _write_table(table, sidecar, stamp):
+    metadata = {**(table.schema.metadata or {}), SOURCE_KEY: json.dumps(stamp).encode()}
+    tmp = sidecar + ".tmp"
+    pq.write_table(table.replace_schema_metadata(metadata), tmp)
+    # Atomic swap, so a concurrent reader never sees a half-written file
+    os.replace(tmp, sidecar)
+    return sidecar
+
+
+def write_sidecar(path, df=None, stamp=None):
+    """Convert the export at ``path`` (or an already parsed ``df``) to its Parquet sidecar.
+
+    ``stamp`` is the ``source_stamp`` taken before ``df`` was read (default: now).
+    """
+    if df is None:
+        stamp = source_stamp(path)
+        df = read_inventory(path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    return _write_table(table, sidecar_path(path), stamp or source_stamp(path))
+
+
+def restamp_sidecar(path):
+    """Record the CSV's current size and mtime in its sidecar (after a rewrite with the same content)."""
+    sidecar = sidecar_path(path)
+    return _write_table(pq.read_table(sidecar), sidecar, source_stamp(path))
+
+
+def load_inventory(path):
+    """Load the export at ``path``, from its Parquet sidecar when that is up to date.
+
+    A stale or missing sidecar is rebuilt from the CSV when the directory is writable.
+    """
+    if sidecar_is_fresh(path):
+        with profiling.stage("Parquet sidecar read"):
+            return pd.read_parquet(sidecar_path(path), memory_map=True)
+    stamp = source_stamp(path)
+    df = read_inventory(path)
+    try:
+        with profiling.stage("Parquet sidecar write"):
+            write_sidecar(path, df, stamp)
+    except OSError:
+        pass  # read-only location: keep serving from the CSV
+    return df
+
+
+if __name__ == "__main__":
+    failed = False
+    for csv in sys.argv[1:]:
+        try:
+            print(f"{csv} -> {write_sidecar(csv)}")
+        except (OSError, ValueError) as e:
+            print(f"{csv}: {e}", file=sys.stderr)
+            failed = True
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,62 @@
+"""Server-side windowing for the large resource tables.
+
+Search and sort are resolved to an array of row positions on the server; only
+the rows of the requested page are then materialized and sent to the browser.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cloudmart.loader import TAGGED_LABELS
+
+
+def search_positions(df, text, columns=None, rows=None):
+    """Positions of the rows where any of ``columns`` contains ``text`` (case-insensitive).
+
+    ``rows`` (sorted positions) restricts the search to those rows of ``df``.
+    """
+    if rows is not None:
+        return rows if not text else rows[search_positions(df.iloc[rows], text, columns)]
+    if not text:
+        return np.arange(len(df))
+    text = text.lower()
+    columns = columns if columns is not None else list(df.columns)
+    hits = np.zeros(len(df), dtype=bool)
+    for col in columns:
+        values = df[col]
+        if col == "Tagged":
+            # Shown as Yes/No (loader.with_tag_labels): matched on those labels (or True/False)
+            labels = {flag: text in label.lower() or text in str(flag).lower() for flag, label in TAGGED_LABELS.items()}
+            hits |= values.map(labels).fillna(False).to_numpy(dtype=bool)
+        elif isinstance(values.dtype, pd.CategoricalDtype):
+            # Match the categories once, then map the codes (-1 = missing never matches)
+            matches = values.cat.categories.astype(str).str.lower().str.contains(text, regex=False)
+            codes = values.cat.codes.to_numpy()
+            hits |= np.append(np.asarray(matches, dtype=bool), False)[codes]
+        elif pd.api.types.is_string_dtype(values.dtype):
+            hits |= values.str.lower().str.contains(text, regex=False).fillna(False).to_numpy(dtype=bool)
+        else:
+            # Missing values are shown blank, so they never match (not even "nan")
+            matches = values.astype(str).str.lower().str.contains(text, regex=False)
+            hits |= matches.to_numpy(dtype=bool) & values.notna().to_numpy()
+    return np.flatnonzero(hits)
+
+
+def sort_positions(df, positions, by=None, ascending=True):
+    """``positions`` ordered by column ``by`` (stable, missing values last)."""
+    if by is None:
+        return positions
+    values = df[by].iloc[positions].reset_index(drop=True)
+    order = values.sort_values(ascending=ascending, kind="stable", na_position="last").index.to_numpy()
+    return positions[order]
+
+
+def page_count(n_rows, page_size):
+    return max(1, -(-n_rows // page_size))
+
+
+def page(df, positions, page_number, page_size):
+    """Rows of ``df`` on 1-based ``page_number`` of ``positions``."""
+    start = (page_number - 1) * page_size
+    return df.iloc[positions[start:start + page_size]]
+
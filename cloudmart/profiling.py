@@ -0,0 +1,168 @@
+"""Per-rerun performance instrumentation.
+
+Code marks its stages with ``with profiling.stage(name):``.  A stage is timed
+by the profiler running on the current thread (Streamlit runs every session's
+script on a thread of its own) and costs nothing when there is none, so the
+library modules can be instrumented unconditionally.  Stages nest: a Task Set
+contains the tables it computes and the figures it builds.
+
+With ``trace_memory`` the peak of Python allocations above the level at stage
+entry is recorded too (``tracemalloc``; it slows allocation-heavy code down
+and counts every thread's allocations, so it is opt-in).
+
+A finished run is one JSON object per line in the log:
+
+    {"run": "script", "started": "...", "seconds": 1.93, "peak_memory_mb": 212.4,
+     "context": {...}, "stages": [{"stage": "Task Set 2", "depth": 0,
+     "start": 0.61, "seconds": 0.04, "peak_memory_mb": 1.2}, ...]}
+"""
+
+import contextlib
+import datetime
+import json
+import threading
+import time
+import tracemalloc
+
+MB = 1024 * 1024
+
+_local = threading.local()
+# tracemalloc is process-wide: it runs while at least one run traces memory
+_tracing_lock = threading.Lock()
+_tracing_runs = 0
+_log_lock = threading.Lock()
+
+
+def _start_tracing():
+    global _tracing_runs
+    with _tracing_lock:
+        if not _tracing_runs and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        _tracing_runs += 1
+
+
+def _stop_tracing():
+    global _tracing_runs
+    with _tracing_lock:
+        _tracing_runs -= 1
+        if not _tracing_runs:
+            tracemalloc.stop()
+
+
+class Profiler:
+    """Timings (and optionally memory peaks) of the stages of one run."""
+
+    def __init__(self, run, trace_memory=False):
+        self.run = run
+        self.trace_memory = trace_memory
+        self.context = {}
+        self.stages = []
+        self.started = datetime.datetime.now(datetime.timezone.utc)
+        self._origin = time.perf_counter()
+        self._seconds = None
+        # Highest allocation level seen so far by each open stage (innermost last)
+        self._peaks = []
+        self._depth = 0
+        if trace_memory:
+            _start_tracing()
+            self._base = tracemalloc.get_traced_memory()[0]
+            self._peaks.append(self._base)
+            tracemalloc.reset_peak()
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        record = {"stage": name, "depth": self._depth, "start": round(time.perf_counter() - self._origin, 6)}
+        self.stages.append(record)
+        self._depth += 1
+        if self.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            # tracemalloc keeps a single peak: fold it into the enclosing stage before resetting it
+            self._peaks[-1] = max(self._peaks[-1], peak)
+            tracemalloc.reset_peak()
+            self._peaks.append(current)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            record["seconds"] = round(time.perf_counter() - started, 6)
+            self._depth -= 1
+            if self.trace_memory:
+                peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+                record["peak_memory_mb"] = round((peak - current) / MB, 3)
+                self._peaks[-1] = max(self._peaks[-1], peak)
+                tracemalloc.reset_peak()
+
+    def finish(self):
+        self._seconds = time.perf_counter() - self._origin
+        if self.trace_memory:
+            self._peak = max(self._peaks.pop(), tracemalloc.get_traced_memory()[1])
+            _stop_tracing()
+
+    def to_record(self):
+        record = {"run": self.run, "started": self.started.isoformat(timespec="milliseconds"),
+                  "seconds": round(self._seconds, 6)}
+        if self.trace_memory:
+            record["peak_memory_mb"] = round((self._peak - self._base) / MB, 3)
+        record["context"] = self.context
+        record["stages"] = self.stages
+        return record
+
+    def write_log(self, path):
+        """Append the finished run to the JSON-lines log at ``path``."""
+        line = json.dumps(self.to_record(), default=str) + "\n"
+        with _log_lock, open(path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+
+
+def current():
+    """The profiler of the run in progress on this thread, if any."""
+    return getattr(_local, "profiler", None)
+
+
+def start(run, trace_memory=False):
+    """Begin profiling a run on this thread (replacing one left unfinished, e.g. by a rerun)."""
+    stale = current()
+    if stale is not None and stale._seconds is None:
+        stale.finish()
+    _local.profiler = Profiler(run, trace_memory)
+    return _local.profiler
+
+
+def finish(log_path=None):
+    """End this thread's run; its record is appended to ``log_path`` when given."""
+    profiler = current()
+    _local.profiler = None
+    if profiler is None:
+        return None
+    profiler.finish()
+    if log_path:
+        try:
+            profiler.write_log(log_path)
+        except OSError:
+            pass  # read-only location: the run just isn't logged
+    return profiler
+
+
+def stage(name):
+    """Time the enclosed block as a stage of the current run (no-op outside a run)."""
+    profiler = current()
+    return profiler.stage(name) if profiler is not None else contextlib.nullcontext()
+
+
+@contextlib.contextmanager
+def section(name, log_path=None, trace_memory=False):
+    """``stage(name)`` within the current run, or a run of its own when there is none.
+
+    For code that also runs on its own - a Streamlit fragment rerun, a download
+    callback - so it gets a log entry either way.
+    """
+    if current() is not None:
+        with stage(name):
+            yield
+        return
+    profiler = start(name, trace_memory)
+    try:
+        with profiler.stage(name):
+            yield
+    finally:
+        finish(log_path)
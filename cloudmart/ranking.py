@@ -0,0 +1,54 @@
+"""Top-k selection for the ranking sections.
+
+Instead of sorting a whole series or frame to show its first few entries, the
+k best values are found with a partial selection (``np.argpartition``, linear
+time) and only those are sorted.  Ties are broken by a secondary key - the
+ResourceID for resource rows, the label for aggregated series - so the result
+doesn't depend on the order the rows happen to be in.  Missing values rank last.
+"""
+
+import numpy as np
+import pandas as pd
+
+from cloudmart.edits import KEY_COLUMN
+
+
+def _tie_keys(tie_break, positions):
+    # Only the candidates' keys are converted; plain strings compare consistently, missing sort first
+    if tie_break is None:
+        return np.zeros(len(positions), dtype=object)
+    values = pd.Series(tie_break).iloc[positions]
+    return values.astype(object).fillna("").astype(str).to_numpy(dtype=object)
+
+
+def top_k_positions(values, k, ascending=True, tie_break=None):
+    """Positions of the ``k`` first entries of ``values`` in rank order.
+
+    ``tie_break`` holds one secondary key per entry; equal keys fall back to position.
+    """
+    key = pd.Series(values).to_numpy(dtype=float, na_value=np.nan)
+    key = np.where(np.isnan(key), np.inf, key if ascending else -key)
+    if k < len(key):
+        kth = np.partition(key, k - 1)[k - 1]
+        better = np.flatnonzero(key < kth)
+        tied = np.flatnonzero(key == kth)
+        room = k - len(better)
+        if room < len(tied):
+            # Only the tied entries with the smallest secondary keys make the cut
+            tied = tied[np.argpartition(_tie_keys(tie_break, tied), room - 1)[:room]]
+        candidates = np.concatenate([better, tied])
+    else:
+        candidates = np.arange(len(key))
+    order = np.lexsort((candidates, _tie_keys(tie_break, candidates), key[candidates]))
+    return candidates[order]
+
+
+def top_k(series, k, ascending=False):
+    """The ``k`` largest (``ascending``: smallest) values of ``series``, ties by index label."""
+    return series.iloc[top_k_positions(series, k, ascending, series.index)]
+
+
+def top_k_rows(df, by, k, ascending=True, tie_break=KEY_COLUMN):
+    """The ``k`` rows of ``df`` with the smallest (or largest) ``by``, ties by ``tie_break``."""
+    ties = df[tie_break] if tie_break in df.columns else None
+    return df.iloc[top_k_positions(df[by], k, ascending, ties)]
@@ -0,0 +1,75 @@
+"""Optional DuckDB query backend for the dashboard aggregations.
+
+The inventory is exposed to an embedded DuckDB database as an ``inventory``
+view - over the Parquet sidecar when it is up to date (DuckDB scans it directly,
+column-wise), or over an in-memory DataFrame otherwise (registered through
+Arrow, without copying).  The cost cube and the per-column missing counts are
+then computed as SQL group-by/count queries, which DuckDB runs vectorized
+across all cores; everything downstream answers from the resulting
+``CostCube`` exactly as with the pandas build.
+
+DuckDB is optional: ``duckdb`` is ``None`` when it isn't installed and the
+dashboard only offers the pandas engine.
+"""
+
+import threading
+
+import pandas as pd
+
+try:
+    import duckdb
+except ImportError:  # optional: the DuckDB engine is offered only when it is installed
+    duckdb = None
+
+from cloudmart.cube import COUNT_COLUMN, CUBE_DIMENSIONS, CostCube
+from cloudmart.loader import COST_COLUMN
+
+
+def _ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + text.replace("'", "''") + "'"
+
+
+class SqlInventory:
+    """The inventory as a DuckDB view; ``source`` is a Parquet path or a DataFrame."""
+
+    def __init__(self, source):
+        if duckdb is None:
+            raise ImportError("the DuckDB engine needs the 'duckdb' package")
+        self._conn = duckdb.connect()
+        self._lock = threading.Lock()
+        if isinstance(source, pd.DataFrame):
+            self._conn.register("inventory", source)
+        else:
+            self._conn.execute(f"CREATE VIEW inventory AS SELECT * FROM read_parquet({_literal(source)})")
+        self.columns = [row[0] for row in self._conn.execute("DESCRIBE inventory").fetchall()]
+
+    def query(self, sql):
+        # The cached backend is shared by sessions running on different threads; a registered
+        # DataFrame is only visible to this connection, so queries take turns on it (each one
+        # still runs multithreaded inside DuckDB)
+        with self._lock:
+            return self._conn.execute(sql).df()
+
+    def missing_counts(self):
+        """Number of missing values per column (``df.isnull().sum()``)."""
+        counts = ", ".join(f"COUNT(*) - COUNT({_ident(col)})" for col in self.columns)
+        row = self.query(f"SELECT {counts} FROM inventory").iloc[0]
+        return pd.Series(row.to_numpy(dtype="int64"), index=self.columns)
+
+    def cost_cube(self, dimensions=CUBE_DIMENSIONS):
+        """``CostCube.from_inventory``, as one GROUP BY query."""
+        dimensions = [col for col in dimensions if col in self.columns]
+        keys = ", ".join(_ident(col) for col in dimensions)
+        frame = self.query(
+            f"SELECT {keys}, SUM({_ident(COST_COLUMN)}) AS {_ident(COST_COLUMN)}, "
+            f"COUNT(*) AS {_ident(COUNT_COLUMN)} FROM inventory GROUP BY {keys}"
+        )
+        # SUM over only-NULL costs is NULL in SQL, 0 in pandas
+        frame[COST_COLUMN] = frame[COST_COLUMN].fillna(0.0)
+        if "Tagged" in frame.columns:
+            frame["Tagged"] = frame["Tagged"].astype("boolean")
+        return CostCube(frame, dimensions)
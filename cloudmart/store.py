@@ -0,0 +1,74 @@
+"""Persistent remediation store.
+
+Tag fixes made in the Task 5 editor are appended to a local SQLite database
+next to the inventory export (``<name>.remediation.sqlite``), one row per
+patch, so every committed cell costs a single INSERT and nothing is ever
+rewritten.  Replaying the log in order (latest patch wins) rebuilds the
+``EditLog`` that the dashboard overlays onto the loaded inventory.
+"""
+
+import json
+import os
+import sqlite3
+import time
+
+from cloudmart.edits import EditLog
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patches (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    op TEXT NOT NULL,
+    resource_id TEXT NOT NULL,
+    column_name TEXT,
+    value TEXT,
+    committed_at REAL NOT NULL
+)
+"""
+
+
+def store_path(path):
+    """Remediation store kept next to the CSV export at ``path``."""
+    return os.path.splitext(path)[0] + ".remediation.sqlite"
+
+
+class RemediationStore:
+    """Append-only log of remediation patches (``EditLog.patches()`` tuples)."""
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute(SCHEMA)
+
+    def _connect(self):
+        # One short-lived connection per call: Streamlit runs sessions on different threads
+        return sqlite3.connect(self.path, timeout=30)
+
+    def version(self):
+        """Sequence number of the latest patch (0 while empty); changes with every append."""
+        with self._connect() as conn:
+            return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM patches").fetchone()[0]
+
+    def append(self, patches):
+        """Append ``(op, key, column, value)`` patches; returns how many were written."""
+        now = time.time()
+        rows = [(op, key, column, json.dumps(value, default=str), now) for op, key, column, value in patches]
+        if rows:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT INTO patches (op, resource_id, column_name, value, committed_at) VALUES (?, ?, ?, ?, ?)",
+                    rows,
+                )
+        return len(rows)
+
+    def load(self, version=None):
+        """Replay the committed patches into an ``EditLog`` - up to ``version`` (a ``version()``) if given."""
+        log = EditLog()
+        with self._connect() as conn:
+            query = "SELECT op, resource_id, column_name, value FROM patches"
+            if version is None:
+                rows = conn.execute(query + " ORDER BY seq")
+            else:
+                rows = conn.execute(query + " WHERE seq <= ? ORDER BY seq", (version,))
+            for op, key, column, value in rows:
+                log.apply_patch(op, key, column, json.loads(value))
+        return log
@@ -0,0 +1,157 @@
+"""Out-of-core mode for inventories larger than memory.
+
+The export is streamed through the loader in fixed-size row chunks.  Each
+chunk is folded into the reduced results the dashboard needs - the cost cube,
+per-column missing counts, the missing-tag histogram and the lowest-scoring
+resources - and then dropped, so memory is bounded by the chunk size rather
+than by the file.  Row-level tables are served from an on-disk index: the
+incomplete resources are appended to a Parquet file (one row group per chunk)
+whose row-group offsets let a page be read without touching the rest.
+
+Everything is kept in ``<name>.ooc/`` next to the export, with the summary
+pickled alongside and reused for as long as the export is unchanged.
+"""
+
+import os
+import pickle
+import shutil
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from cloudmart import compliance, loader
+from cloudmart.cube import CostCube
+from cloudmart.ranking import top_k_rows
+
+CHUNK_ROWS = 250_000
+# How many of the lowest-scoring resources are kept (the Top N control goes up to this)
+LOWEST_ROWS = 100
+PREVIEW_ROWS = 5
+SUMMARY_FILE = "summary.pkl"
+INCOMPLETE_FILE = "incomplete.parquet"
+
+ARROW_TYPES = {"category": pa.large_string(), "str": pa.large_string(),
+               "float64": pa.float64(), "boolean": pa.bool_()}
+
+
+def index_dir(path):
+    """Directory holding the out-of-core index of the export at ``path``."""
+    return os.path.splitext(path)[0] + ".ooc"
+
+
+def iter_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Typed frames of at most ``chunk_rows`` rows each, streamed from the export at ``path``."""
+    layout, header = loader.sniff(path)
+    with loader.open_rows(path, layout) as stream:
+        reader = pd.read_csv(stream, header=0, names=header, dtype=loader.read_dtypes(header),
+                             encoding="utf-8", chunksize=chunk_rows)
+        for chunk in reader:
+            yield loader.apply_schema(chunk)
+
+
+def arrow_schema(columns):
+    # Fixed up front: categories differ from chunk to chunk, so categoricals are stored as strings
+    return pa.schema([(col, ARROW_TYPES[loader.INVENTORY_SCHEMA.get(col, "str")]) for col in columns])
+
+
+class RowStore:
+    """Read-only paged access to a Parquet file of resource rows."""
+
+    def __init__(self, path):
+        self.path = path
+        metadata = pq.read_metadata(path)
+        sizes = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        # offsets[i] = first row of row group i
+        self.offsets = np.concatenate([[0], np.cumsum(sizes, dtype=np.int64)])
+
+    def __len__(self):
+        return int(self.offsets[-1])
+
+    def rows(self, start, stop):
+        """Rows ``start:stop``, reading only the row groups that hold them."""
+        stop = min(stop, len(self))
+        if start >= stop:
+            return pd.DataFrame()
+        first = int(np.searchsorted(self.offsets, start, side="right")) - 1
+        last = int(np.searchsorted(self.offsets, stop, side="left"))
+        table = pq.ParquetFile(self.path).read_row_groups(range(first, last))
+        skip = start - int(self.offsets[first])
+        frame = table.slice(skip, stop - start).to_pandas()
+        frame.index = pd.RangeIndex(start, stop)
+        return frame
+
+
+class InventorySummary:
+    """Reduced results of one streaming pass over the export."""
+
+    def __init__(self, columns, tag_fields):
+        self.columns = list(columns)
+        self.tag_fields = [col for col in tag_fields if col in self.columns]
+        self.n_rows = 0
+        self.preview = None
+        self.missing = pd.Series(0, index=self.columns, dtype="int64")
+        self.cube = None
+        self.histogram = np.zeros(256, dtype=np.int64)
+        self.lowest = None
+        self.incomplete_path = None
+
+    def fold(self, chunk):
+        """Add one chunk of the inventory; returns the chunk's incomplete rows."""
+        if self.preview is None:
+            self.preview = chunk.head(PREVIEW_ROWS)
+        self.n_rows += len(chunk)
+        self.missing += chunk.isnull().sum()
+        chunk_cube = CostCube.from_inventory(chunk)
+        self.cube = chunk_cube if self.cube is None else CostCube.combine([self.cube, chunk_cube])
+        if not self.tag_fields:
+            return chunk.iloc[:0]
+        mask = compliance.missing_bitmask(chunk, self.tag_fields)
+        self.histogram += compliance.mask_histogram(mask)
+        scored = chunk.assign(CompletenessScore=compliance.completeness_score(mask, len(self.tag_fields)))
+        lowest = top_k_rows(scored, "CompletenessScore", LOWEST_ROWS)
+        if self.lowest is not None:
+            # Earlier chunks first, so position ties still follow file order
+            lowest = top_k_rows(pd.concat([self.lowest, lowest]), "CompletenessScore", LOWEST_ROWS)
+        self.lowest = lowest
+        return chunk[compliance.rows_missing(mask)]
+
+    def missing_counts(self):
+        return compliance.histogram_counts(self.histogram, self.tag_fields)
+
+    def incomplete_rows(self):
+        return RowStore(self.incomplete_path)
+
+
+def summarize(path, chunk_rows=CHUNK_ROWS, tag_fields=compliance.TAG_FIELDS):
+    """Stream the export at ``path`` into an ``InventorySummary`` (reused while the export is unchanged)."""
+    directory = index_dir(path)
+    identity = loader.file_identity(path)
+    summary_file = os.path.join(directory, SUMMARY_FILE)
+    try:
+        with open(summary_file, "rb") as fh:
+            saved_identity, summary = pickle.load(fh)
+        if saved_identity == identity and os.path.exists(summary.incomplete_path):
+            return summary
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError):
+        pass
+
+    # Build into a scratch directory and swap it in, so readers never see a half-written index
+    scratch = directory + ".tmp"
+    shutil.rmtree(scratch, ignore_errors=True)
+    os.makedirs(scratch)
+    header = loader.sniff(path)[1]
+    schema = arrow_schema(header)
+    summary = InventorySummary(header, tag_fields)
+    with pq.ParquetWriter(os.path.join(scratch, INCOMPLETE_FILE), schema) as writer:
+        for chunk in iter_chunks(path, chunk_rows):
+            incomplete = summary.fold(chunk)
+            if len(incomplete):
+                writer.write_table(pa.Table.from_pandas(incomplete, schema=schema, preserve_index=False))
+    summary.incomplete_path = os.path.join(directory, INCOMPLETE_FILE)
+    with open(os.path.join(scratch, SUMMARY_FILE), "wb") as fh:
+        pickle.dump((identity, summary), fh)
+    shutil.rmtree(directory, ignore_errors=True)
+    os.replace(scratch, directory)
+    return summary